@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+import argparse
+import itertools
+import os
+import time
+
+import weaver
+
+
+def write_per_line(path, passwords):
+    with open(path, 'w', encoding='utf-8') as f:
+        for pw in passwords:
+            f.write(pw + '\n')
+
+
+def product_enumerate(pat, tokens, pools, min_len, max_len):
+    for combo in itertools.product(*pools):
+        word_vals = [v for (n, k, _), v in zip(tokens, combo) if k == 'word']
+        if len(word_vals) != len(set(word_vals)):
+            continue
+        pw = weaver.fill_pattern(pat, tokens, combo)
+        if min_len <= len(pw) <= max_len:
+            yield pw
+
+
+def prefix_enumerate(pat, tokens, pools, min_len, max_len):
+    return weaver.iter_pattern(pat, tokens, pools, None, min_len, max_len)
+
+
+def bench_enumeration(max_len):
+    words = [f'word{i}' for i in range(40)]
+    numbers = [str(1990 + i) for i in range(30)]
+    specials = list('!@#$%')
+    patterns = [
+        '{word1}{number}{special}',
+        '{Word1}{word2}{number}{special}',
+        '{word1}{special}{word2}{number}{special}',
+    ]
+    for pat in patterns:
+        tokens = weaver.parse_placeholders(pat)
+        pools = weaver.pattern_pools(tokens, words, numbers, specials)
+        timings = []
+        for run in (product_enumerate, prefix_enumerate):
+            start = time.perf_counter()
+            count = sum(1 for _ in run(pat, tokens, pools, 0, max_len))
+            timings.append(time.perf_counter() - start)
+        print(f"{len(tokens)} slots, max {max_len:3}: {count:9} candidates "
+              f"product {timings[0]:7.3f}s  prefix {timings[1]:7.3f}s  "
+              f"speedup {timings[0] / timings[1]:5.1f}x")
+
+
+def bench_shared_prefixes(max_len):
+    words = [f'word{i}' for i in range(40)]
+    numbers = [str(1990 + i) for i in range(30)]
+    gen = weaver.Weaver.from_dsl('WW;WWn;WWnS;WWnSn;WnW', words=words,
+                                 numbers=numbers, specials=list('!@#$%'),
+                                 max_length=max_len)
+    timings = []
+    for run in (lambda: gen.iter_range(0, len(gen)), lambda: iter(gen)):
+        start = time.perf_counter()
+        count = sum(1 for _ in run())
+        timings.append(time.perf_counter() - start)
+    print(f"5 patterns, max {max_len:3}: {count:9} candidates "
+          f"per-pattern {timings[0]:7.3f}s  trie {timings[1]:7.3f}s  "
+          f"speedup {timings[0] / timings[1]:5.1f}x")
+
+
+def bench_fan_out(path):
+    words = [f'word{i}' for i in range(40)]
+    numbers = [str(1990 + i) for i in range(30)]
+    patterns = 'WnS;WWn;WnW'
+    bounds = [(6, 10), (8, 14), (12, 100)]
+    gen = weaver.Weaver.from_dsl(patterns, words=words, numbers=numbers,
+                                 specials=list('!@#$%'))
+    sinks = [weaver.Sink(f'{path}.{i}', low, high)
+             for i, (low, high) in enumerate(bounds)]
+    start = time.perf_counter()
+    weaver.fan_out(gen, sinks)
+    fan_out = time.perf_counter() - start
+    start = time.perf_counter()
+    for sink, (low, high) in zip(sinks, bounds):
+        gen = weaver.Weaver.from_dsl(patterns, words=words, numbers=numbers,
+                                     specials=list('!@#$%'), min_length=low,
+                                     max_length=high)
+        weaver.write_wordlist(sink.output, sorted(set(gen)))
+    separate = time.perf_counter() - start
+    start = time.perf_counter()
+    gen = weaver.Weaver.from_dsl(patterns, words=words, numbers=numbers,
+                                 specials=list('!@#$%'))
+    weaver.write_wordlist(path, sorted(set(gen)))
+    single = time.perf_counter() - start
+    for sink in sinks:
+        os.unlink(sink.output)
+    os.unlink(path)
+    print(f"{len(sinks)} sinks: separate runs {separate:7.3f}s  "
+          f"fan-out {fan_out:7.3f}s  single unfiltered run {single:7.3f}s")
+
+
+def bench_writers(passwords, path):
+    cases = [
+        ('per-line f.write', lambda: write_per_line(path, passwords)),
+        ('background writer', lambda: weaver.write_wordlist(path, passwords)),
+        ('background writer + writev',
+         lambda: weaver.write_wordlist(path, passwords, use_writev=True)),
+    ]
+    for name, run in cases:
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(path) / (1 << 20)
+        print(f"{name:30} {elapsed:8.3f}s {size / elapsed:8.1f} MiB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Weaver benchmarks')
+    parser.add_argument('--lines', type=int, default=2_000_000,
+                        help='Number of candidates to write')
+    parser.add_argument('--output', default='bench_output.txt',
+                        help='Scratch file for the write benchmarks')
+    args = parser.parse_args()
+
+    for max_len in (100, 16):
+        bench_enumeration(max_len)
+        bench_shared_prefixes(max_len)
+    bench_fan_out(args.output)
+
+    passwords = [f'Password{i}!' for i in range(args.lines)]
+    print(f"Writing {len(passwords)} candidates")
+    bench_writers(passwords, args.output)
+    os.unlink(args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 import weaver
+import itertools
 import unittest
 import tempfile
 import os
@@ -823,6 +824,1412 @@ class TestEdgeCasesAndErrorHandling(unittest.TestCase):
         self.assertIn('test space', result)
 
 
+class TestWeaverAPI(unittest.TestCase):
+    """Test the importable Weaver library API."""
+
+    def test_compile_patterns_dsl(self):
+        """Test translating the DSL into placeholder patterns."""
+        self.assertEqual(weaver.compile_patterns('Wn;ws'),
+                         ['{word0}{number}', '{word0}{special}'])
+        self.assertEqual(weaver.compile_patterns('W', 'any'), ['{word0*}'])
+
+    def test_iteration_is_lazy(self):
+        """Test that candidates are produced on demand."""
+        gen = weaver.Weaver(['{word1}{number}'], ['admin', 'user'],
+                            [str(i) for i in range(1000)])
+
+        it = iter(gen)
+        self.assertEqual(next(it), 'admin0')
+        self.assertEqual(next(it), 'admin1')
+
+    def test_len_is_keyspace(self):
+        """Test that len() comes from the pool sizes, not from iteration."""
+        gen = weaver.Weaver(['{word1}{number}{special}', '{word1*}'],
+                            ['admin', 'user'], ['1', '2', '3'], ['!', '@'])
+
+        self.assertEqual(len(gen), 2 * 3 * 2 + 6)
+
+    def test_matches_generate_passwords(self):
+        """Test that the unique candidates match the function API."""
+        patterns = ['{Word1}{number}', '{word1}{word2}']
+        words = ['admin', 'user', 'root']
+        numbers = ['1', '22']
+
+        gen = weaver.Weaver(patterns, words, numbers)
+
+        self.assertEqual(gen.unique(), weaver.generate_passwords(
+            patterns, words, numbers, []))
+
+    def test_constraints_applied(self):
+        """Test that length and group rules are applied while iterating."""
+        gen = weaver.Weaver.from_dsl('ww', words=['admin', 'user', 'pw'],
+                                     min_length=5, max_length=9,
+                                     word_groups=[['admin', 'user']])
+
+        self.assertEqual(sorted(gen),
+                         ['adminpw', 'pwadmin', 'pwuser', 'userpw'])
+
+    def test_main_accepts_argv(self):
+        """Test that main can be driven without patching sys.argv."""
+        temp_dir = tempfile.mkdtemp()
+        output_file = os.path.join(temp_dir, 'out.txt')
+        try:
+            weaver.main(['--patterns', 'wn', '--words', 'a;b',
+                         '--numbers', '1', '--output', output_file])
+            with open(output_file) as f:
+                self.assertEqual(f.read().split(), ['a1', 'b1'])
+        finally:
+            import shutil
+            shutil.rmtree(temp_dir)
+
+
+class TestMasks(unittest.TestCase):
+    """Test brute-force mask slots in patterns."""
+
+    def test_compile_patterns_masks(self):
+        """Test mask tokens and repeat counts in the DSL."""
+        self.assertEqual(weaver.compile_patterns('W?d4;?u?l2n'),
+                         ['{word0}{mask:?d4}', '{mask:?u?l2}{number}'])
+
+    def test_parse_mask(self):
+        """Test expanding a mask into per-position charsets."""
+        charsets = weaver.parse_mask('?d2?1', {'1': 'xy'})
+
+        self.assertEqual(charsets, ('0123456789', '0123456789', 'xy'))
+        with self.assertRaises(ValueError):
+            weaver.parse_mask('?q')
+        with self.assertRaises(ValueError):
+            weaver.parse_mask('abc')
+
+    def test_mask_pool_is_lazy_and_indexable(self):
+        """Test size, order and random access without materializing."""
+        pool = weaver.MaskPool(weaver.parse_mask('?d8'))
+
+        self.assertEqual(len(pool), 10 ** 8)
+        self.assertEqual(pool[0], '00000000')
+        self.assertEqual(pool[12345678], '12345678')
+        self.assertEqual(pool[-1], '99999999')
+        self.assertEqual(list(itertools.islice(pool, 3)),
+                         ['00000000', '00000001', '00000002'])
+
+    def test_generate_with_mask(self):
+        """Test a word followed by a mask slot."""
+        result = weaver.generate_passwords(['{word1}{mask:?1?d}'], ['pw'],
+                                           [], [], charsets={'1': 'ab'})
+
+        self.assertEqual(len(result), 20)
+        self.assertIn('pwa0', result)
+        self.assertIn('pwb9', result)
+
+    def test_mask_keyspace_and_length_filter(self):
+        """Test keyspace counting and length pruning of mask slots."""
+        gen = weaver.Weaver(['{word1}{mask:?d3}'], ['a', 'abcdef'],
+                            max_length=5)
+
+        self.assertEqual(len(gen), 1000)
+        self.assertEqual(next(iter(gen)), 'a000')
+
+    def test_mask_class_guarantees_policy(self):
+        """Test that a digit mask satisfies a digit policy without checks."""
+        gen = weaver.Weaver(['{word1}{mask:?d}', '{word1}{mask:?l}'],
+                            ['pw'], policy=weaver.parse_policy('digit'))
+
+        self.assertEqual(len(gen), 10)
+        self.assertEqual(gen._compiled[0][4], 0)
+
+    def test_main_mask_pattern(self):
+        """Test main function with a mask in the DSL."""
+        temp_dir = tempfile.mkdtemp()
+        output_file = os.path.join(temp_dir, 'out.txt')
+        try:
+            weaver.main(['--patterns', 'w?1?d', '--words', 'pw',
+                         '--charset1', '?u!', '--output', output_file])
+            with open(output_file) as f:
+                passwords = f.read().split()
+        finally:
+            import shutil
+            shutil.rmtree(temp_dir)
+
+        self.assertEqual(len(passwords), 270)
+        self.assertIn('pw!0', passwords)
+        self.assertIn('pwZ9', passwords)
+
+
+class TestPrefixEnumeration(unittest.TestCase):
+    """Test the prefix-sharing enumeration against a brute-force product."""
+
+    def distinct_cases(self, v, kind, case):
+        cases = {}
+        for c in weaver.slot_cases(kind, case):
+            cases.setdefault(weaver.apply_case(v, c) if kind == 'word' else c,
+                             c)
+        return cases.values()
+
+    def brute_force(self, pat, tokens, pools, min_len, max_len):
+        out = []
+        dims = [[(v, c) for v in pool
+                 for c in self.distinct_cases(v, kind, case)]
+                for (_, kind, case), pool in zip(tokens, pools)]
+        for combo in itertools.product(*dims):
+            word_vals = [v for (_, k, _), (v, _) in zip(tokens, combo)
+                         if k == 'word']
+            if len(word_vals) != len(set(word_vals)):
+                continue
+            pw = weaver.fill_pattern(pat, tokens, [
+                weaver.apply_case(v, c) if k == 'word' else v
+                for (_, k, _), (v, c) in zip(tokens, combo)])
+            if min_len <= len(pw) <= max_len:
+                out.append(pw)
+        return out
+
+    def test_matches_product_in_order(self):
+        """Test identical output and order for 3-5 slot patterns."""
+        words = ['a', 'bb', 'Ccc', 'dddd']
+        numbers = ['1', '22', '333']
+        specials = ['!', '@@']
+        for pat in ['{word1}{number}{special}',
+                    'x{Word1}-{word2*}{number}.',
+                    '{word1}{word2}{number}{special}{word3}']:
+            tokens = weaver.parse_placeholders(pat)
+            pools = weaver.pattern_pools(tokens, words, numbers, specials)
+            for bounds in [(0, 100), (5, 8), (9, 9)]:
+                self.assertEqual(
+                    list(weaver.iter_pattern(pat, tokens, pools, None, *bounds)),
+                    self.brute_force(pat, tokens, pools, *bounds),
+                    (pat, bounds))
+
+    def test_pattern_segments(self):
+        """Test splitting a pattern into literals around its placeholders."""
+        pat = 'a{word1}{invalid}b{number}'
+        tokens = weaver.parse_placeholders(pat)
+
+        self.assertEqual(weaver.pattern_segments(pat, tokens),
+                         ['a', '{invalid}b', ''])
+
+    def test_prefix_longer_than_max_is_cut(self):
+        """Test that a branch is cut once its prefix exceeds the maximum."""
+        pool = weaver.MaskPool(weaver.parse_mask('?d6'))
+        tokens = [('word1', 'word', 'lower'), ('mask:?d6', 'mask', None)]
+
+        result = list(weaver.iter_pattern('{word1}{mask:?d6}', tokens,
+                                          [['toolongword'], pool], max_len=10))
+
+        self.assertEqual(result, [])
+
+
+class TestVirtualNumberPools(unittest.TestCase):
+    """Test range and date number pools that are never materialized"""
+
+    def test_range_pool(self):
+        """Test range size, padding, indexing and length histogram."""
+        pool = weaver.parse_number_spec('range:5-120')
+        self.assertEqual(len(pool), 116)
+        self.assertEqual(pool[0], '5')
+        self.assertEqual(pool[-1], '120')
+        self.assertEqual(pool.length_histogram(), {1: 5, 2: 90, 3: 21})
+        self.assertEqual(list(pool)[:3], ['5', '6', '7'])
+
+        pins = weaver.parse_number_spec('range:0000-9999')
+        self.assertEqual(len(pins), 10000)
+        self.assertEqual(pins[42], '0042')
+        self.assertEqual(pins.length_histogram(), {4: 10000})
+
+    def test_date_pool(self):
+        """Test that date pools cover every calendar day in the years."""
+        pool = weaver.parse_number_spec('date:ddmmyy:1970..2005')
+        self.assertEqual(len(pool), 13149)
+        self.assertEqual(pool[0], '010170')
+        self.assertEqual(pool[59], '010370')
+        self.assertEqual(pool[-1], '311205')
+        self.assertEqual(pool.length_histogram(), {6: 13149})
+
+        leap = list(weaver.parse_number_spec('date:mm-dd-yyyy:2000'))
+        self.assertEqual(len(leap), 366)
+        self.assertIn('02-29-2000', leap)
+
+        with self.assertRaises(ValueError):
+            weaver.parse_number_spec('date:yyyy:2000')
+
+    def test_date_pool_without_day_or_month(self):
+        """Test that formats missing dd or mm do not repeat values."""
+        months = weaver.parse_number_spec('date:mmyy:1990..1991')
+        self.assertEqual(len(months), 24)
+        self.assertEqual(len(set(months)), 24)
+        self.assertEqual((months[0], months[-1]), ('0190', '1291'))
+        self.assertEqual(list(weaver.parse_number_spec('date:yyyymm:1990')),
+                         [f'1990{m:02d}' for m in range(1, 13)])
+
+        days = weaver.parse_number_spec('date:dd-yy:1990..1991')
+        self.assertEqual(len(days), 62)
+        self.assertEqual(len(set(days)), 62)
+        self.assertEqual((days[30], days[31]), ('31-90', '01-91'))
+
+    def test_mixed_numbers_stay_lazy(self):
+        """Test that specs and literal numbers combine into one lazy pool."""
+        pool = weaver.build_number_pool(['7', 'range:1998-2001', 'date:ddmm:1999'])
+        self.assertTrue(weaver.is_lazy(pool))
+        self.assertEqual(len(pool), 1 + 4 + 366)
+        self.assertEqual([pool[i] for i in range(6)],
+                         ['7', '1998', '1999', '2000', '2001', '0101'])
+        self.assertEqual(weaver.build_number_pool(['1', '2']), ['1', '2'])
+
+    def test_weaver_with_virtual_numbers(self):
+        """Test enumeration, pruning, sharding and groups over a range."""
+        gen = weaver.Weaver(['{word0}{number}', '{number}{number}'], ['ab'],
+                            ['range:5-15'], max_length=4,
+                            number_groups=[['5', '6']])
+        expected = sorted(
+            [f'ab{n}' for n in range(5, 16)] +
+            [f'{a}{b}' for a in range(5, 10) for b in range(5, 10)
+             if {a, b} != {5, 6}] +
+            [f'{a}{b}' for a in range(5, 16) for b in range(5, 16)
+             if len(f'{a}{b}') in (3, 4) and {a, b} != {5, 6}])
+
+        self.assertEqual(sorted(gen), expected)
+        parts = []
+        for start in range(0, len(gen), 7):
+            parts.extend(gen.iter_range(start, start + 7))
+        self.assertEqual(sorted(parts), expected)
+
+    def test_main_numbers_range(self):
+        """Test --numbers with a range through the CLI."""
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'out.txt')
+            weaver.main(['--patterns', 'n', '--numbers', 'range:1-3;9',
+                         '--output', output])
+            with open(output) as f:
+                self.assertEqual(f.read().split(), ['1', '2', '3', '9'])
+
+    def test_dashed_literals_are_kept(self):
+        """Test that dashed numbers without the range: prefix stay literal."""
+        self.assertIsNone(weaver.parse_number_spec('12-25'))
+        self.assertEqual(weaver.build_number_pool(['12-25', '25-12']),
+                         ['12-25', '25-12'])
+        gen = weaver.Weaver(['{word0}{number}'], ['a'], ['12-25', '7'])
+        self.assertEqual(sorted(gen), ['a12-25', 'a7'])
+        with self.assertRaises(ValueError):
+            weaver.parse_number_spec('range:12')
+
+
+class TestGroupedFiles(unittest.TestCase):
+    """Test loading comma-grouped @file lists"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, name, content):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def test_load_grouped_file(self):
+        """Test the values and groups of a grouped file."""
+        path = self.write('words.txt',
+                          'admin\nsummer, winter\n\njon,jonsson,\n,\nsolo,\n')
+
+        values, groups = weaver.load_grouped_file(path)
+
+        self.assertEqual(values, ['admin', 'summer', 'winter', 'jon',
+                                  'jonsson', ',', 'solo'])
+        self.assertEqual(groups, [['summer', 'winter'], ['jon', 'jonsson']])
+
+    def test_load_grouped_file_nonexistent(self):
+        """Test that a missing grouped file raises FileNotFoundError."""
+        with self.assertRaises(FileNotFoundError):
+            weaver.load_grouped_file(os.path.join(self.temp_dir, 'none.txt'))
+
+    def test_main_keeps_file_groups(self):
+        """Test that groups from @files apply to words, numbers and specials."""
+        words = self.write('words.txt', 'summer,winter\nadmin\n')
+        numbers = self.write('numbers.txt', '1,2\n3\n')
+        specials = self.write('specials.txt', '!,@\n')
+        output = os.path.join(self.temp_dir, 'out.txt')
+
+        weaver.main(['--patterns', 'wwnnss', '--words', f'@{words}',
+                     '--numbers', f'@{numbers}', '--specials', f'@{specials}',
+                     '--output', output])
+
+        with open(output) as f:
+            passwords = f.read().split()
+        self.assertIn('summeradmin13!!', passwords)
+        self.assertFalse(any('summer' in pw and 'winter' in pw
+                             for pw in passwords))
+        self.assertFalse(any('12' in pw or '21' in pw for pw in passwords))
+        self.assertFalse(any('!@' in pw or '@!' in pw for pw in passwords))
+
+
+class TestPackedPool(unittest.TestCase):
+    """Test buffer-backed pools and sharing them with worker processes"""
+
+    def test_sequence_access(self):
+        """Test indexing, slicing, iteration and the group id array."""
+        pool = weaver.PackedPool.from_groups(
+            ['Jón', 'summer', 'Winter', 'x'], [['summer', 'winter']],
+            fold_case=True)
+
+        self.assertEqual(len(pool), 4)
+        self.assertEqual(list(pool), ['Jón', 'summer', 'Winter', 'x'])
+        self.assertEqual(pool[0], 'Jón')
+        self.assertEqual(pool[-1], 'x')
+        self.assertEqual(pool[1:3], ['summer', 'Winter'])
+        self.assertEqual(list(pool.group_ids), [-1, 0, 0, -1])
+        self.assertEqual(pool.groups(), [['summer', 'Winter']])
+        with self.assertRaises(IndexError):
+            pool[4]
+
+    def test_share_and_attach(self):
+        """Test that an attached pool sees the same values and arrays."""
+        pool = weaver.PackedPool(['a', 'bb', 'ccc'], [0, 0, -1])
+        shm, name = pool.share()
+        try:
+            attached = weaver.PackedPool.attach(name)
+            self.assertEqual(list(attached), ['a', 'bb', 'ccc'])
+            self.assertEqual(list(attached.group_ids), [0, 0, -1])
+            attached.close()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def test_weaver_accepts_packed_pools(self):
+        """Test that packed pools enumerate like plain lists."""
+        words = ['cat', 'dog', 'bird']
+        plain = weaver.Weaver(['{Word0}{word1}{special}'], words,
+                              specials=['!', '@'], word_groups=[['cat', 'dog']])
+        packed = weaver.Weaver(['{Word0}{word1}{special}'],
+                               weaver.PackedPool(words),
+                               specials=weaver.PackedPool(['!', '@']),
+                               word_groups=[['cat', 'dog']])
+
+        self.assertEqual(sorted(packed), sorted(plain))
+
+    def test_iter_parallel(self):
+        """Test that worker shards reproduce the keyspace enumeration."""
+        gen = weaver.Weaver.from_dsl(
+            'WnS;WW?d;n', words=['Cat', 'dog', 'bird'],
+            numbers=['1', '22', 'range:1990-1995'], specials=['!', '@'],
+            word_groups=[['cat', 'dog']], number_groups=[['1', '22']],
+            min_length=4, max_length=12)
+
+        self.assertEqual(list(gen.iter_parallel(2, shard_size=40)),
+                         list(gen.iter_range(0, len(gen))))
+
+    def test_iter_parallel_keeps_weaver_groups(self):
+        """Test that workers apply the Weaver's groups to a packed pool."""
+        gen = weaver.Weaver(['{word0}{word1}'],
+                            weaver.PackedPool(['cat', 'dog', 'bird']),
+                            word_groups=[['cat', 'dog'], ['cat', 'bird']])
+        parallel = list(gen.iter_parallel(2, shard_size=2))
+
+        self.assertEqual(parallel, list(gen.iter_range(0, len(gen))))
+        self.assertEqual(sorted(parallel), ['birddog', 'dogbird'])
+
+
+class TestFanOut(unittest.TestCase):
+    """Test feeding several filtered outputs from one generation pass"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.options = dict(words=['cat', 'dog', 'Fish'],
+                            numbers=['1', '22', 'range:1990-1992'],
+                            specials=['!', '@'])
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read().splitlines()
+
+    def test_sinks_match_separate_runs(self):
+        """Test that each sink gets what a run with its own rules would."""
+        configs = [
+            dict(min_length=1, max_length=6),
+            dict(min_length=7, max_length=12, word_groups=[['cat', 'fish']]),
+            dict(min_length=4, max_length=10, number_groups=[['1', '1990']],
+                 special_groups=[['!', '@']]),
+            dict(policy=weaver.parse_policy('upper,digit')),
+        ]
+        sinks = [weaver.Sink(os.path.join(self.temp_dir, f'{i}.txt'), **c)
+                 for i, c in enumerate(configs)]
+        gen = weaver.Weaver.from_dsl('WnS;wWn;nS', 'any', **self.options)
+
+        counts = weaver.fan_out(gen, sinks)
+
+        for sink, config, count in zip(sinks, configs, counts):
+            expected = sorted(weaver.Weaver.from_dsl(
+                'WnS;wWn;nS', 'any', **self.options, **config).unique())
+            self.assertEqual(self.read(sink.output), expected)
+            self.assertEqual(count, len(expected))
+
+    def test_streamed_and_parallel(self):
+        """Test the streamed path and sharded generation without groups."""
+        gen = weaver.Weaver.from_dsl('WnS;Wn', **self.options)
+        expected = sorted(weaver.Weaver.from_dsl(
+            'WnS;Wn', min_length=5, max_length=7, **self.options))
+        for kwargs in ({'dedup': False, 'sort': False}, {'workers': 2}):
+            sink = weaver.Sink(os.path.join(self.temp_dir, 'out.txt'), 5, 7)
+            weaver.fan_out(gen, [sink], **kwargs)
+            self.assertEqual(sorted(self.read(sink.output)), expected)
+
+    def test_provenance_values(self):
+        """Test that provenance pairs carry the uncased slot values."""
+        gen = weaver.Weaver.from_dsl('Wn', 'any', words=['cat'],
+                                     numbers=['1'])
+        values = (('word', 'cat'), ('number', '1'))
+        self.assertEqual(sorted(gen.iter_provenance()),
+                         [('CAT1', values), ('Cat1', values), ('cat1', values)])
+
+    def test_main_sinks_file(self):
+        """Test --sinks with a JSON file and the sink bounds defaults."""
+        short = os.path.join(self.temp_dir, 'short.txt')
+        grouped = os.path.join(self.temp_dir, 'grouped.txt')
+        config = os.path.join(self.temp_dir, 'sinks.json')
+        with open(config, 'w') as f:
+            json.dump({'sinks': [
+                {'output': short, 'max_length': 5},
+                {'output': grouped, 'word_groups': 'cat,dog'},
+            ]}, f)
+
+        weaver.main(['--patterns', 'wn;ww', '--words', 'cat;dog;fish',
+                     '--numbers', '1', '--min-length', '4',
+                     '--sinks', config,
+                     '--output', os.path.join(self.temp_dir, 'unused.txt')])
+
+        self.assertEqual(self.read(short), ['cat1', 'dog1', 'fish1'])
+        self.assertIn('catfish', self.read(grouped))
+        self.assertNotIn('catdog', self.read(grouped))
+        self.assertIn('dog1', self.read(grouped))
+        self.assertFalse(os.path.exists(
+            os.path.join(self.temp_dir, 'unused.txt')))
+
+    def test_invalid_sinks(self):
+        """Test that bad sink files and conflicting options are rejected."""
+        config = os.path.join(self.temp_dir, 'sinks.json')
+        with open(config, 'w') as f:
+            json.dump([{'max_length': 5}], f)
+        for extra in ([], ['--hash', 'md5']):
+            with patch('sys.stderr', new_callable=StringIO):
+                with self.assertRaises(SystemExit):
+                    weaver.main(['--patterns', 'wn', '--words', 'cat',
+                                 '--sinks', config] + extra)
+
+
+class TestPlanner(unittest.TestCase):
+    """Test the cost-based generation planner"""
+
+    def setUp(self):
+        self.gen = weaver.Weaver.from_dsl(
+            'WnS;WWn', words=['cat', 'dog', 'bird'], numbers=['1', '22'],
+            specials=['!', '@'], word_groups=[['cat', 'dog']])
+
+    def test_small_job_stays_in_memory(self):
+        """Test that a small keyspace uses the trie and an in-memory set."""
+        plan = weaver.plan_generation(self.gen, workers=8)
+
+        self.assertEqual(plan['keyspace'], len(self.gen))
+        self.assertEqual(plan['enumeration'], 'trie')
+        self.assertEqual(plan['workers'], 1)
+        self.assertEqual(plan['dedup'], 'memory')
+        self.assertTrue(plan['sort'])
+        self.assertGreater(plan['memory_estimate'], 0)
+
+    def test_budget_and_overrides(self):
+        """Test that a tight budget spills and that overrides are kept."""
+        plan = weaver.plan_generation(self.gen, memory_limit=100)
+        self.assertEqual(plan['dedup'], 'spill')
+        self.assertTrue(plan['sort'])
+
+        plan = weaver.plan_generation(self.gen, workers=2, memory_limit=100,
+                                      enumeration='parallel', dedup='none',
+                                      sort=False)
+        self.assertEqual(plan['enumeration'], 'parallel')
+        self.assertEqual(plan['workers'], 2)
+        self.assertEqual(plan['dedup'], 'none')
+        self.assertFalse(plan['sort'])
+        self.assertIn('keyspace', weaver.format_plan(plan))
+
+    def test_strategies_agree(self):
+        """Test that every dedup and sort strategy yields the same set."""
+        expected = sorted(self.gen.unique())
+        base = weaver.plan_generation(self.gen)
+
+        for changes in ({}, {'dedup': 'spill', 'run_size': 5},
+                        {'dedup': 'none', 'sort': False},
+                        {'enumeration': 'parallel', 'workers': 2}):
+            plan = dict(base, **changes)
+            records = weaver.execute_plan(self.gen, plan)
+            out = list(records)
+            if changes.get('dedup') == 'none':
+                self.assertEqual(sorted(set(out)), expected)
+            else:
+                self.assertEqual(out, expected)
+            if isinstance(records, weaver.SpilledSet):
+                self.assertGreater(len(records.runs), 1)
+                self.assertEqual(len(records), len(expected))
+                records.close()
+
+    def test_main_explain(self):
+        """Test that --explain prints the plan without writing output."""
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'out.txt')
+            with patch('sys.stdout', new_callable=StringIO) as stdout:
+                weaver.main(['--patterns', 'Wn', '--words', 'cat',
+                             '--numbers', '1', '--explain',
+                             '--output', output])
+
+            self.assertIn('Plan:', stdout.getvalue())
+            self.assertIn('dedup', stdout.getvalue())
+            self.assertFalse(os.path.exists(output))
+
+    def test_main_spill_matches_default(self):
+        """Test that --dedup spill writes the same file as the default."""
+        with tempfile.TemporaryDirectory() as tmp:
+            outputs = []
+            for name, extra in (('a.txt', []),
+                                ('b.txt', ['--dedup', 'spill',
+                                           '--spill-dir', tmp])):
+                output = os.path.join(tmp, name)
+                weaver.main(['--patterns', 'WnS;Wn', '--words', 'cat;dog',
+                             '--numbers', '1;range:1-30', '--specials', '!@',
+                             '--output', output] + extra)
+                with open(output) as f:
+                    outputs.append(f.read())
+
+            self.assertEqual(outputs[0], outputs[1])
+            self.assertEqual(sorted(os.listdir(tmp)), ['a.txt', 'b.txt'])
+
+
+class TestProfiling(unittest.TestCase):
+    """Test per-phase profiling output"""
+
+    def test_phase_files(self):
+        """Test that a phase writes pstats and collapsed stacks."""
+        import pstats
+
+        def busy():
+            return sum(i * i for i in range(300000))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            profiler = weaver.PhaseProfiler(tmp, interval=0.001)
+            with profiler.phase('work'):
+                busy()
+
+            self.assertIn('work', profiler.timings)
+            stats = pstats.Stats(os.path.join(tmp, 'work.pstats'))
+            self.assertTrue(any(func[2] == 'busy' for func in stats.stats))
+            with open(os.path.join(tmp, 'work.collapsed')) as f:
+                lines = f.read().splitlines()
+            self.assertTrue(lines)
+            self.assertTrue(any('busy (' in line for line in lines))
+            for line in lines:
+                stack, count = line.rsplit(' ', 1)
+                self.assertGreater(int(count), 0)
+
+    def test_main_profile(self):
+        """Test --profile with both modes through the CLI."""
+        with tempfile.TemporaryDirectory() as tmp:
+            for mode in ('cprofile', 'sample'):
+                out_dir = os.path.join(tmp, mode)
+                weaver.main(['--patterns', 'Wn', '--words', 'cat;dog',
+                             '--numbers', 'range:1-50', '--profile', out_dir,
+                             '--profile-mode', mode,
+                             '--output', os.path.join(tmp, 'out.txt')])
+                files = sorted(os.listdir(out_dir))
+                if mode == 'cprofile':
+                    self.assertEqual(files, [
+                        'generate.collapsed', 'generate.pstats',
+                        'sort.collapsed', 'sort.pstats',
+                        'write.collapsed', 'write.pstats'])
+                else:
+                    self.assertEqual(files, ['generate.collapsed',
+                                             'sort.collapsed',
+                                             'write.collapsed'])
+
+
+class TestSampling(unittest.TestCase):
+    """Test uniform sampling of the keyspace by unranking indices"""
+
+    def setUp(self):
+        self.gen = weaver.Weaver.from_dsl(
+            'WnS;WWn;n?d2', words=['cat', 'dog', 'bird'],
+            numbers=['1', 'range:1990-2025'], specials=['!', '@'],
+            word_groups=[['cat', 'dog']], min_length=5, max_length=12)
+
+    def test_unrank_covers_valid_candidates(self):
+        """Test that unranking every index reproduces the enumeration."""
+        unranked = [self.gen.unrank(i) for i in range(len(self.gen))]
+
+        self.assertEqual(sorted(pw for pw in unranked if pw is not None),
+                         sorted(self.gen))
+        self.assertIsNone(self.gen.unrank(
+            next(i for i, pw in enumerate(unranked) if pw is None)))
+        with self.assertRaises(IndexError):
+            self.gen.unrank(len(self.gen))
+
+    def test_sample_is_distinct_and_seeded(self):
+        """Test that samples are distinct, valid and reproducible."""
+        sample = self.gen.sample(200, seed=7)
+
+        self.assertEqual(len(sample), 200)
+        self.assertEqual(len(set(sample)), 200)
+        self.assertTrue(set(sample) <= set(self.gen))
+        self.assertEqual(sample, self.gen.sample(200, seed=7))
+        self.assertNotEqual(sample, self.gen.sample(200, seed=8))
+
+    def test_sample_larger_than_keyspace(self):
+        """Test that oversized samples return every valid candidate."""
+        gen = weaver.Weaver(['{word0}{word1}'], ['a', 'b', 'c'])
+
+        self.assertEqual(sorted(gen.sample(100, seed=1)), sorted(gen))
+
+    def test_main_sample(self):
+        """Test --sample and --seed through the CLI."""
+        with tempfile.TemporaryDirectory() as tmp:
+            outputs = []
+            for name in ('a.txt', 'b.txt'):
+                output = os.path.join(tmp, name)
+                weaver.main(['--patterns', 'Wn', '--words', 'cat;dog',
+                             '--numbers', 'range:1000-9999', '--sample', '5',
+                             '--seed', '42', '--output', output])
+                with open(output) as f:
+                    outputs.append(f.read().split())
+
+            self.assertEqual(len(outputs[0]), 5)
+            self.assertEqual(outputs[0], outputs[1])
+
+    def test_main_rejects_non_positive_sample(self):
+        """Test that --sample 0 or below is a usage error."""
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'out.txt')
+            for k in ('0', '-5'):
+                with patch('sys.stderr', new_callable=StringIO):
+                    with self.assertRaises(SystemExit):
+                        weaver.main(['--patterns', 'Wn', '--words', 'cat',
+                                     '--numbers', '1', '--sample', k,
+                                     '--output', output])
+            self.assertFalse(os.path.exists(output))
+
+
+class TestDistinctWords(unittest.TestCase):
+    """Test word slots laid out as k-permutations of the word list"""
+
+    def test_keyspace_counts_permutations(self):
+        """Test that len() counts distinct-word combinations only."""
+        words = ['cat', 'dog', 'bird', 'emu']
+        self.assertEqual(len(weaver.Weaver(['{word0}{word1}'], words)), 4 * 3)
+        self.assertEqual(len(weaver.Weaver(['{Word0}{word1}{WORD2}'], words)),
+                         4 * 3 * 2)
+        self.assertEqual(len(weaver.Weaver(['{word0*}{word1}{number}'], words,
+                                           ['1', '2'])), 4 * 3 * 3 * 2)
+        self.assertEqual(len(weaver.Weaver(['{word0}{word1}{word2}'],
+                                           ['cat', 'dog'])), 0)
+
+    def test_no_index_repeats_a_word(self):
+        """Test that every keyspace index unranks to distinct words."""
+        gen = weaver.Weaver(['{word0*}{number}{Word1}'], ['cat', 'dog', 'emu'],
+                            ['1', '2'])
+        unranked = [gen.unrank(i) for i in range(len(gen))]
+
+        self.assertNotIn(None, unranked)
+        self.assertEqual(len(set(unranked)), len(gen))
+        self.assertEqual(unranked, list(gen.iter_range(0, len(gen))))
+        self.assertEqual(sorted(unranked), sorted(gen))
+
+    def test_case_variants_are_the_same_word(self):
+        """Test that a word cannot pair with another case of itself."""
+        result = weaver.Weaver(['{word0*}{word1*}'], ['cat', 'dog']).unique()
+
+        self.assertIn('catDOG', result)
+        self.assertNotIn('catCAT', result)
+        self.assertEqual(len(result), 2 * 3 * 3)
+
+    def test_caseless_words_are_not_repeated(self):
+        """Test that a word without letters yields one case variant."""
+        gen = weaver.Weaver(['{word0*}{number}'], ['123', 'abc'], ['1', '2'])
+        expected = ['1231', '1232', 'ABC1', 'ABC2', 'Abc1', 'Abc2',
+                    'abc1', 'abc2']
+
+        self.assertEqual(sorted(gen), expected)
+        self.assertEqual(sorted(gen.iter_range(0, len(gen))), expected)
+        unranked = [gen.unrank(i) for i in range(len(gen))]
+        self.assertEqual(sorted(pw for pw in unranked if pw), expected)
+        served = weaver.CandidateServer(gen, batch_size=3)
+        batches = [served.batch(b) for b in range(served.total)]
+        self.assertEqual(sorted(sum(batches, [])), expected)
+        self.assertEqual(sorted(gen.sample(20, seed=1)), expected)
+
+    def test_unequal_pools_fall_back_to_product(self):
+        """Test that differing word pools keep the product layout."""
+        tokens = weaver.parse_placeholders('{word0}{word1}')
+        size, strides, perm = weaver.keyspace_layout(
+            tokens, [['cat', 'dog'], ['dog', 'emu']])
+
+        self.assertEqual((size, strides, perm), (4, [2, 1], ()))
+        self.assertEqual(list(weaver.iter_pattern(
+            '{word0}{word1}', tokens, [['cat', 'dog'], ['dog', 'emu']])),
+            ['catdog', 'catemu', 'dogemu'])
+
+
+class TestSharedPrefixTrie(unittest.TestCase):
+    """Test enumeration of patterns merged into a shared-prefix trie"""
+
+    def per_pattern(self, gen):
+        return sorted(itertools.chain.from_iterable(
+            weaver.iter_pattern(pat, tokens, pools, tags, gen.min_length,
+                                gen.max_length)
+            for pat, tokens, pools, tags, _ in gen._compiled))
+
+    def test_shared_prefixes_are_merged(self):
+        """Test that patterns with a common prefix share trie nodes."""
+        gen = weaver.Weaver.from_dsl('Wn;WnS;WnSn;nW',
+                                     words=['cat', 'dog'],
+                                     numbers=['1', '22'], specials=['!'])
+        root = weaver.build_pattern_trie(gen._compiled)
+
+        self.assertEqual(len(root.children), 2)
+        word = next(c for c in root.children.values() if c.children)
+        number = next(iter(word.children.values()))
+        self.assertEqual(len(number.ends), 1)
+        self.assertEqual(len(number.children), 1)
+
+    def test_matches_per_pattern_results(self):
+        """Test that the trie emits exactly the per-pattern candidates."""
+        gen = weaver.Weaver.from_dsl(
+            'W;Wn;WnS;WnSn;WW;WWn;nW;W?d',
+            words=['cat', 'dog', 'bird'], numbers=['1', '22', '333'],
+            specials=['!', '@'], min_length=4, max_length=9,
+            word_groups=[['cat', 'dog']], number_groups=[['1', '22']])
+
+        self.assertEqual(sorted(gen), self.per_pattern(gen))
+
+    def test_policy_residual_is_per_pattern(self):
+        """Test that each pattern keeps its own residual class check."""
+        gen = weaver.Weaver(['{word0}', '{word0}{number}', '{WORD0}{number}'],
+                            ['cat', 'dog'], ['1'],
+                            policy=weaver.parse_policy('lower,digit'))
+
+        self.assertEqual(sorted(gen), ['cat1', 'dog1'])
+        self.assertEqual(sorted(gen), self.per_pattern(gen))
+
+
+class TestProvenanceConflicts(unittest.TestCase):
+    """Test group conflict checks based on the values used per slot."""
+
+    def test_substring_is_not_a_conflict(self):
+        """Test that a word containing another group member is kept."""
+        result = weaver.generate_passwords(
+            ['{word1}{word2}'], ['jonsson', 'snati', 'jon'], [], [],
+            word_groups=[['jon', 'snati']])
+
+        self.assertIn('jonssonsnati', result)
+        self.assertIn('jonjonsson', result)
+        self.assertNotIn('jonsnati', result)
+        self.assertNotIn('snatijon', result)
+
+    def test_case_variants_share_membership(self):
+        """Test that every case variant of a member belongs to its group."""
+        result = weaver.generate_passwords(
+            ['{word1*}{word2}'], ['admin', 'user', 'root'], [], [],
+            word_groups=[['Admin', 'user']])
+
+        self.assertIn('ADMINroot', result)
+        self.assertNotIn('ADMINadmin', result)
+        self.assertNotIn('ADMINuser', result)
+        self.assertNotIn('Useradmin', result)
+
+    def test_number_and_special_groups(self):
+        """Test conflicts across number and special slots."""
+        result = weaver.generate_passwords(
+            ['{number}{number}{special}{special}'], [], ['12', '123'],
+            ['!', '@'], number_groups=[['12', '123']],
+            special_groups=[['!', '@']])
+
+        self.assertEqual(result, {'1212!!', '1212@@', '123123!!', '123123@@'})
+
+    def test_index_groups_skips_singletons(self):
+        """Test that single-member groups produce no rules."""
+        index = weaver.index_groups([['Jon', 'Snati'], ['solo']],
+                                    fold_case=True)
+
+        self.assertEqual(index, {'jon': (0,), 'snati': (0,)})
+
+    def test_member_of_several_groups(self):
+        """Test that a value in two groups enforces both of them."""
+        words = ['jon', 'jonsson', 'smith', 'snati']
+        groups = [['jon', 'jonsson'], ['jon', 'smith']]
+        gen = weaver.Weaver(['{word0}{word1}'], words, word_groups=groups)
+        expected = ['jonsnati', 'jonssonsmith', 'jonssonsnati',
+                    'smithjonsson', 'smithsnati', 'snatijon',
+                    'snatijonsson', 'snatismith']
+
+        self.assertEqual(weaver.index_groups(groups)['jon'], (0, 1))
+        self.assertEqual(sorted(gen), expected)
+        self.assertEqual(sorted(gen.iter_range(0, len(gen))), expected)
+        self.assertEqual(sorted(filter(None, map(gen.unrank,
+                                                 range(len(gen))))),
+                         expected)
+        sink = weaver.Sink('unused.txt', word_groups=groups)
+        self.assertFalse(sink.check('jonsmith',
+                                    (('word', 'jon'), ('word', 'smith'))))
+
+    def test_main_uses_slot_groups(self):
+        """Test main function keeps substrings of group members."""
+        temp_dir = tempfile.mkdtemp()
+        output_file = os.path.join(temp_dir, 'out.txt')
+        try:
+            weaver.main(['--patterns', 'ww', '--words', 'jon,jonsson;x',
+                         '--output', output_file])
+            with open(output_file) as f:
+                passwords = f.read().split()
+        finally:
+            import shutil
+            shutil.rmtree(temp_dir)
+
+        self.assertEqual(sorted(passwords),
+                         ['jonssonx', 'jonx', 'xjon', 'xjonsson'])
+
+
+class TestPolicy(unittest.TestCase):
+    """Test password-policy pruning before enumeration."""
+
+    def test_parse_policy(self):
+        """Test parsing classes and length rules."""
+        policy = weaver.parse_policy('upper, digits, special, 12-20')
+
+        self.assertEqual(policy['classes'], 2 | 4 | 8)
+        self.assertEqual((policy['min_length'], policy['max_length']),
+                         (12, 20))
+        self.assertEqual(weaver.parse_policy('min=8')['min_length'], 8)
+        with self.assertRaises(ValueError):
+            weaver.parse_policy('emoji')
+        with self.assertRaises(ValueError):
+            weaver.parse_policy('20-12')
+        with self.assertRaises(ValueError):
+            weaver.parse_policy('min=12,max=8')
+
+    def test_impossible_pattern_dropped(self):
+        """Test that a pattern lacking a required class is never enumerated."""
+        policy = weaver.parse_policy('digit')
+        gen = weaver.Weaver(['{word1}{special}', '{word1}{number}'],
+                            ['admin'], ['1'], ['!'], policy=policy)
+
+        self.assertEqual(len(gen), 1)
+        self.assertEqual(list(gen), ['admin1'])
+
+    def test_pools_narrowed_by_length(self):
+        """Test that values which can never fit the length bounds are dropped."""
+        gen = weaver.Weaver(['{word1}{number}'], ['ab', 'abcdef', 'abcdefghij'],
+                            ['1', '12'], policy=weaver.parse_policy('7-8'))
+
+        self.assertEqual(len(gen), 2)
+        self.assertEqual(sorted(gen), ['abcdef1', 'abcdef12'])
+
+    def test_ambiguous_slots_checked_per_candidate(self):
+        """Test that results match a brute-force policy filter."""
+        words = ['admin', 'Root', 'x1', 'p@ss']
+        numbers = ['1', '22', '']
+        specials = ['!', 'a']
+        patterns = ['{Word1}{number}{special}', '{word1*}{special}']
+        policy = weaver.parse_policy('upper,digit,special,4-8')
+
+        gen = weaver.Weaver(patterns, words, numbers, specials, policy=policy)
+
+        expected = {pw for pw in weaver.generate_passwords(
+            patterns, words, numbers, specials)
+            if 4 <= len(pw) <= 8 and weaver.char_classes(pw) & 14 == 14}
+        self.assertEqual(gen.unique(), expected)
+        self.assertIn('Admin1!', expected)
+        self.assertIn('Admin22!', expected)
+
+    def test_main_policy_option(self):
+        """Test main function with a policy."""
+        temp_dir = tempfile.mkdtemp()
+        output_file = os.path.join(temp_dir, 'out.txt')
+        try:
+            weaver.main(['--patterns', 'Wn;W', '--words', 'admin;user',
+                         '--numbers', '1;2024', '--policy', 'upper,digit,min=6',
+                         '--pattern-mode', 'any', '--output', output_file])
+            with open(output_file) as f:
+                passwords = f.read().split()
+        finally:
+            import shutil
+            shutil.rmtree(temp_dir)
+
+        self.assertEqual(sorted(passwords),
+                         ['ADMIN1', 'ADMIN2024', 'Admin1', 'Admin2024',
+                          'USER2024', 'User2024'])
+
+
+class TestCandidateServer(unittest.TestCase):
+    """Test the batch-serving daemon and its client."""
+
+    def start_server(self, generator, **kwargs):
+        import asyncio
+        import threading
+        server = weaver.CandidateServer(generator, **kwargs)
+        ready = threading.Event()
+        thread = threading.Thread(target=asyncio.run, args=(server.serve(
+            port=0, ready=lambda address: ready.set()),), daemon=True)
+        thread.start()
+        self.assertTrue(ready.wait(5))
+        return server, thread
+
+    def test_iter_range_slices_keyspace(self):
+        """Test that consecutive ranges reproduce the full enumeration."""
+        gen = weaver.Weaver(['{word1}{number}', '{word1}{word2}'],
+                            ['a', 'b', 'c'], ['1', '2'])
+        size = len(gen)
+
+        parts = []
+        for start in range(0, size, 4):
+            parts.extend(gen.iter_range(start, start + 4))
+
+        self.assertEqual(sorted(parts), sorted(gen))
+
+    def test_batches_reuse_slot_entries(self):
+        """Test that slot entries are built once, not per batch."""
+        gen = weaver.Weaver(['{word1}{number}'], ['a', 'b', 'c'],
+                            ['1', '2'])
+        server = weaver.CandidateServer(gen, batch_size=2)
+        with patch.object(weaver, 'slot_entries',
+                          wraps=weaver.slot_entries) as built:
+            batches = [server.batch(b) for b in range(server.total)]
+
+        self.assertEqual(sum(batches, []), list(gen.iter_range(0, len(gen))))
+        self.assertEqual(built.call_count, 2)
+
+    def test_clients_receive_every_batch(self):
+        """Test that batches served to a client cover the keyspace."""
+        gen = weaver.Weaver(['{word1}{mask:?d2}'], ['a', 'b'])
+        server, thread = self.start_server(gen, batch_size=30)
+
+        received = list(weaver.fetch_candidates(server.address))
+
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(received, list(gen))
+        self.assertEqual(server.acked, set(range(7)))
+
+    def test_crashed_client_batch_is_reissued(self):
+        """Test that an unacknowledged batch goes to the next client."""
+        import socket
+        gen = weaver.Weaver(['{word1}{number}'], ['a', 'b', 'c'],
+                            ['1', '2', '3'])
+        server, thread = self.start_server(gen, batch_size=4)
+
+        with socket.create_connection(server.address) as sock:
+            f = sock.makefile('rwb')
+            f.write(b'GET\n')
+            f.flush()
+            bid, count = f.readline().split()[1:]
+            lost = [f.readline().strip().decode() for _ in range(int(count))]
+            f.close()
+
+        received = list(weaver.fetch_candidates(server.address,
+                                                poll_interval=0.01))
+
+        thread.join(5)
+        self.assertEqual(int(bid), 0)
+        self.assertEqual(lost, list(gen)[:4])
+        self.assertEqual(sorted(received), sorted(gen))
+
+
+class TestFilterCommand(unittest.TestCase):
+    """Test the streaming filter for existing wordlists."""
+
+    def test_iter_chunks_splits_on_separator(self):
+        """Test that chunks never cut a candidate in half."""
+        from io import BytesIO
+        data = b''.join(b'word%d\n' % i for i in range(500))
+
+        chunks = list(weaver.iter_chunks(BytesIO(data), chunk_size=37))
+
+        self.assertEqual(b''.join(chunks), data)
+        self.assertTrue(all(c.endswith(b'\n') for c in chunks))
+
+    def test_filter_stream_rules(self):
+        """Test length and group rules applied to a stream."""
+        from io import BytesIO
+        src = BytesIO(b'admin\r\nadminuser\nab\n\npassword123\nuser')
+        dst = BytesIO()
+
+        seen, kept = weaver.filter_stream(src, dst, 3, 100,
+                                          [['admin', 'user']], chunk_size=8)
+
+        self.assertEqual(dst.getvalue(), b'admin\npassword123\nuser\n')
+        self.assertEqual((seen, kept), (5, 3))
+
+    def test_filter_stream_workers_keep_order(self):
+        """Test that a process pool returns batches in input order."""
+        from io import BytesIO
+        words = [f'candidate{i}' for i in range(2000)]
+        src = BytesIO(''.join(w + '\n' for w in words).encode())
+        dst = BytesIO()
+
+        weaver.filter_stream(src, dst, 12, 12, workers=2, chunk_size=1024)
+
+        expected = [w for w in words if len(w) == 12]
+        self.assertEqual(dst.getvalue().decode().split(), expected)
+
+    def test_main_filter_subcommand(self):
+        """Test the filter subcommand dispatch in main."""
+        temp_dir = tempfile.mkdtemp()
+        input_file = os.path.join(temp_dir, 'in.txt')
+        output_file = os.path.join(temp_dir, 'out.txt')
+        with open(input_file, 'w') as f:
+            f.write('summer2024\nsummerwinter\nwinter\n')
+        try:
+            weaver.main(['filter', input_file, '--output', output_file,
+                         '--words', 'summer,winter', '--workers', '1'])
+            with open(output_file) as f:
+                self.assertEqual(f.read().split(), ['summer2024', 'winter'])
+        finally:
+            import shutil
+            shutil.rmtree(temp_dir)
+
+
+class TestPartitionedOutput(unittest.TestCase):
+    """Test splitting the output into several files."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.output = os.path.join(self.temp_dir, 'list.txt')
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        import shutil
+        if os.path.exists(self.temp_dir):
+            shutil.rmtree(self.temp_dir)
+
+    def read(self, name):
+        with open(os.path.join(self.temp_dir, name)) as f:
+            return f.read().split()
+
+    def test_split_lines(self):
+        """Test fixed-size chunks across write batches."""
+        words = [f'pw{i:03d}' for i in range(25)]
+
+        manifest = weaver.write_partitioned(self.output, words,
+                                            split_lines=10, batch_size=4)
+
+        self.assertEqual([f['lines'] for f in manifest['files']], [10, 10, 5])
+        self.assertEqual(manifest['files'][0]['path'], 'list.000.txt')
+        self.assertEqual(self.read('list.002.txt'), words[20:])
+        self.assertEqual(manifest['bytes'], sum(len(w) + 1 for w in words))
+
+    def test_rejects_non_positive_sizes(self):
+        """Test that zero or negative split sizes are refused."""
+        for kwargs in ({'split_lines': 0}, {'split_lines': -1},
+                       {'split_files': 0}):
+            with self.assertRaises(ValueError):
+                weaver.write_partitioned(self.output, ['a', 'b'], **kwargs)
+        for option in ('--split-lines', '--split-files'):
+            with patch('sys.stderr', new_callable=StringIO):
+                with self.assertRaises(SystemExit):
+                    weaver.main(['--patterns', 'Wn', '--words', 'a;b',
+                                 '--numbers', '1', option, '-1',
+                                 '--output', self.output])
+
+    def test_split_files(self):
+        """Test K nearly equal files."""
+        words = [f'pw{i}' for i in range(10)]
+
+        manifest = weaver.write_partitioned(self.output, words, split_files=3)
+
+        self.assertEqual([f['lines'] for f in manifest['files']], [4, 4, 2])
+        self.assertEqual(self.read('list.001.txt'), words[4:8])
+
+    def test_split_by_length_writes_manifest(self):
+        """Test one file per length and the manifest on disk."""
+        words = ['ab', 'abc', 'xy', 'abcd', 'xyz']
+
+        weaver.write_partitioned(self.output, words, by_length=True,
+                                 index_every=1)
+
+        with open(os.path.join(self.temp_dir, 'list.manifest.json')) as f:
+            manifest = json.load(f)
+        self.assertEqual([(f['path'], f['length'], f['lines'])
+                          for f in manifest['files']],
+                         [('list.len02.txt', 2, 2), ('list.len03.txt', 3, 2),
+                          ('list.len04.txt', 4, 1)])
+        self.assertEqual(self.read('list.len03.txt'), ['abc', 'xyz'])
+        reader = weaver.WordlistReader(
+            os.path.join(self.temp_dir, 'list.len02.txt'))
+        self.assertEqual(reader[1], 'xy')
+
+    def test_main_split_files(self):
+        """Test main function with --split-files."""
+        weaver.main(['--patterns', 'wn', '--words', 'a;b;c',
+                     '--numbers', '1;2', '--split-files', '2',
+                     '--output', self.output])
+
+        self.assertEqual(self.read('list.000.txt'), ['a1', 'a2', 'b1'])
+        self.assertEqual(self.read('list.001.txt'), ['b2', 'c1', 'c2'])
+        self.assertFalse(os.path.exists(self.output))
+
+
+class TestHashing(unittest.TestCase):
+    """Test hash output and local hash matching."""
+
+    def test_known_digests(self):
+        """Test each algorithm against a known digest of 'password'."""
+        expected = {
+            'md5': '5f4dcc3b5aa765d61d8327deb882cf99',
+            'sha1': '5baa61e4c9b93f3f0682250b6cf8331b7ee68fd8',
+            'sha256': '5e884898da28047151d0e56f8dc6292773603d0d6aabbdd62a11ef721d1542d8',
+            'ntlm': '8846f7eaee8fb117ad06bdd830b7586c',
+        }
+        for algorithm, digest in expected.items():
+            self.assertEqual(weaver.make_hasher(algorithm)('password'), digest)
+
+    def test_md4_fallback(self):
+        """Test the pure Python MD4 used when OpenSSL lacks it."""
+        self.assertEqual(weaver._md4(b''), '31d6cfe0d16ae931b73c59d7e0c089c0')
+        self.assertEqual(weaver._md4(b'abc'),
+                         'a448017aaf21d8525fc10ae87aa6729d')
+
+    def test_hash_passwords_modes(self):
+        """Test pairs, hash-only output and matching across workers."""
+        words = [f'pw{i}' for i in range(50)]
+        md5 = weaver.make_hasher('md5')
+
+        pairs = list(weaver.hash_passwords(words, 'md5', batch_size=7))
+        self.assertEqual(pairs[3], f'{md5("pw3")}:pw3')
+
+        only = list(weaver.hash_passwords(words, 'md5', hash_only=True))
+        self.assertEqual(only, [md5(w) for w in words])
+
+        targets = {md5('pw7'), md5('pw42'), md5('missing')}
+        matched = list(weaver.hash_passwords(words, 'md5', targets,
+                                             workers=2, batch_size=5))
+        self.assertEqual(matched, [f'{md5("pw7")}:pw7', f'{md5("pw42")}:pw42'])
+
+    def test_load_hashes_dump_formats(self):
+        """Test loading bare hashes and pwdump-style lines."""
+        temp_dir = tempfile.mkdtemp()
+        path = os.path.join(temp_dir, 'hashes.txt')
+        with open(path, 'w') as f:
+            f.write('8846F7EAEE8FB117AD06BDD830B7586C\n')
+            f.write('bob:1001:aad3b435b51404eeaad3b435b51404ee:'
+                    '31d6cfe0d16ae931b73c59d7e0c089c0:::\n')
+            f.write('not-a-hash\n')
+        try:
+            hashes = weaver.load_hashes(path, 'ntlm')
+        finally:
+            import shutil
+            shutil.rmtree(temp_dir)
+
+        self.assertIn('8846f7eaee8fb117ad06bdd830b7586c', hashes)
+        self.assertIn('31d6cfe0d16ae931b73c59d7e0c089c0', hashes)
+        self.assertEqual(len(hashes), 3)
+
+    def test_main_match_option(self):
+        """Test main function reporting only matching candidates."""
+        temp_dir = tempfile.mkdtemp()
+        hash_file = os.path.join(temp_dir, 'hashes.txt')
+        output_file = os.path.join(temp_dir, 'out.txt')
+        with open(hash_file, 'w') as f:
+            f.write(weaver.make_hasher('sha1')('user456') + '\n')
+        try:
+            weaver.main(['--patterns', 'wn', '--words', 'admin;user',
+                         '--numbers', '123;456', '--hash', 'sha1',
+                         '--match', hash_file, '--output', output_file])
+            with open(output_file) as f:
+                lines = f.read().split()
+        finally:
+            import shutil
+            shutil.rmtree(temp_dir)
+
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].endswith(':user456'))
+
+    def test_main_match_file_checked_first(self):
+        """Test that a bad --match file is reported before generating."""
+        with tempfile.TemporaryDirectory() as tmp:
+            output_file = os.path.join(tmp, 'out.txt')
+            args = ['--patterns', 'wn', '--words', 'admin',
+                    '--numbers', '1', '--hash', 'md5',
+                    '--output', output_file, '--match']
+            with patch('sys.stderr', new_callable=StringIO) as stderr, \
+                    patch.object(weaver, 'weaver_from_args') as build:
+                with self.assertRaises(SystemExit):
+                    weaver.main(args + [os.path.join(tmp, 'missing.txt')])
+            build.assert_not_called()
+            self.assertIn('--match', stderr.getvalue())
+
+            hash_file = os.path.join(tmp, 'hashes.txt')
+            with open(hash_file, 'w') as f:
+                f.write(weaver.make_hasher('sha1')('admin1') + '\n')
+            with self.assertLogs(level='WARNING') as logs:
+                weaver.main(args + [hash_file])
+            self.assertIn('No md5 hashes', '\n'.join(logs.output))
+            with open(output_file) as f:
+                self.assertEqual(f.read(), '')
+
+
+class TestIndexedOutput(unittest.TestCase):
+    """Test the indexed output format and its reader."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        import shutil
+        if os.path.exists(self.temp_dir):
+            shutil.rmtree(self.temp_dir)
+
+    def test_write_wordlist_with_index(self):
+        """Test that the index records the offset of every M-th line."""
+        path = os.path.join(self.temp_dir, 'list.txt')
+        words = [f'pw{i}' for i in range(10)]
+
+        count = weaver.write_wordlist(path, words, index_every=4)
+
+        self.assertEqual(count, 10)
+        offsets, every, total, sep = weaver.read_index(path + '.idx')
+        self.assertEqual((every, total, sep), (4, 10, b'\n'))
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.assertEqual(list(offsets), [0, 16, 32])
+        self.assertEqual(data[offsets[1]:].split(b'\n')[0], b'pw4')
+
+    def test_reader_random_access(self):
+        """Test seeking and slicing by candidate number."""
+        path = os.path.join(self.temp_dir, 'list.txt')
+        words = [f'pw{i}' for i in range(100)]
+        weaver.write_wordlist(path, words, index_every=7)
+
+        reader = weaver.WordlistReader(path)
+
+        self.assertEqual(len(reader), 100)
+        self.assertEqual(reader[0], 'pw0')
+        self.assertEqual(reader[50], 'pw50')
+        self.assertEqual(reader[-1], 'pw99')
+        self.assertEqual(reader[13:17], ['pw13', 'pw14', 'pw15', 'pw16'])
+        self.assertEqual(reader[95:200], words[95:])
+        with self.assertRaises(IndexError):
+            reader[100]
+
+    def test_reader_nul_format(self):
+        """Test NUL-separated output keeps candidates containing newlines apart."""
+        path = os.path.join(self.temp_dir, 'list.bin')
+        words = ['a', 'b\nc', 'd']
+        weaver.write_wordlist(path, words, index_every=2, separator='\0')
+
+        reader = weaver.WordlistReader(path)
+
+        self.assertEqual(reader[1], 'b\nc')
+        self.assertEqual(list(reader), words)
+
+    def test_reader_without_index(self):
+        """Test that a missing index is built by scanning the file."""
+        path = os.path.join(self.temp_dir, 'list.txt')
+        weaver.write_wordlist(path, ['x', 'y', 'z'])
+
+        self.assertFalse(os.path.exists(path + '.idx'))
+        self.assertEqual(weaver.WordlistReader(path)[2], 'z')
+
+    def test_read_index_rejects_foreign_file(self):
+        """Test that a file without the index header is rejected."""
+        path = os.path.join(self.temp_dir, 'bogus.idx')
+        with open(path, 'wb') as f:
+            f.write(b'\0' * 64)
+
+        with self.assertRaises(ValueError):
+            weaver.read_index(path)
+
+    def test_index_across_batches(self):
+        """Test index offsets when M does not divide the write batch size."""
+        path = os.path.join(self.temp_dir, 'list.txt')
+        words = [f'pw{i}' for i in range(1000)]
+
+        weaver.write_wordlist(path, words, index_every=7, batch_size=64,
+                              buffer_size=100)
+
+        reader = weaver.WordlistReader(path)
+        self.assertEqual(reader[0:1000], words)
+        self.assertEqual(reader[699], 'pw699')
+
+    def test_background_writer_writev(self):
+        """Test that the writev path writes every chunk in order."""
+        path = os.path.join(self.temp_dir, 'v.bin')
+        chunks = [b'%d,' % i for i in range(5000)]
+
+        with open(path, 'wb') as f, weaver.BackgroundWriter(
+                f, buffer_size=256, use_writev=True) as out:
+            for chunk in chunks:
+                out.write(chunk)
+
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b''.join(chunks))
+
+    @unittest.skipUnless(hasattr(os, 'writev'), 'needs os.writev')
+    def test_writev_without_iov_limit(self):
+        """Test that SC_IOV_MAX of -1 (no limit) still writes everything."""
+        path = os.path.join(self.temp_dir, 'v.bin')
+        chunks = [b'%d,' % i for i in range(3000)]
+
+        with patch('os.sysconf', return_value=-1):
+            with open(path, 'wb') as f, weaver.BackgroundWriter(
+                    f, buffer_size=1 << 20, use_writev=True) as out:
+                for chunk in chunks:
+                    out.write(chunk)
+
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b''.join(chunks))
+
+    def test_background_writer_propagates_errors(self):
+        """Test that an I/O error on the writer thread reaches the caller."""
+        class Broken:
+            def write(self, data):
+                raise OSError('disk full')
+
+        out = weaver.BackgroundWriter(Broken(), buffer_size=1)
+        with self.assertRaises(OSError):
+            for _ in range(10):
+                out.write(b'x')
+            out.close()
+
+    def test_main_index_option(self):
+        """Test main function writing an index next to the output."""
+        output_file = os.path.join(self.temp_dir, 'indexed.txt')
+
+        test_args = [
+            'weaver',
+            '--patterns', 'Wn',
+            '--words', 'admin;user',
+            '--numbers', '1;2;3',
+            '--index-every', '2',
+            '--output', output_file
+        ]
+
+        with patch('sys.argv', test_args):
+            weaver.main()
+
+        reader = weaver.WordlistReader(output_file)
+        self.assertEqual(len(reader), 6)
+        self.assertEqual(reader[3], 'user1')
+
+    def test_main_rejects_negative_index_every(self):
+        """Test that a negative --index-every is a usage error."""
+        output_file = os.path.join(self.temp_dir, 'indexed.txt')
+        with patch('sys.stderr', new_callable=StringIO):
+            with self.assertRaises(SystemExit):
+                weaver.main(['--patterns', 'Wn', '--words', 'admin',
+                             '--numbers', '1', '--index-every', '-2',
+                             '--output', output_file])
+        self.assertFalse(os.path.exists(output_file))
+
+
 class TestPerformanceAndScalability(unittest.TestCase):
     """Test performance and scalability aspects."""
 
@@ -1,14 +1,17 @@
 #!/usr/bin/env python
-import argparse
+import bisect
+import contextlib
 import itertools
-import json
 import logging
 import re
-import unicodedata
+import struct
 import os
+import sys
+from array import array
 
 
 def load_config(path):
+    import json
     with open(path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
@@ -20,14 +23,80 @@ def load_list_from_file(path):
         return [line.strip() for line in f if line.strip()]
 
 
+def load_grouped_file(path):
+    """Stream a grouped list file: one value or comma-separated group per line.
+
+    Returns the values in file order and the groups as lists.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"File not found: {path}")
+    values = []
+    groups = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            members = [m.strip() for m in line.split(',') if m.strip()] \
+                if ',' in line else None
+            if not members:
+                values.append(line)
+            elif len(members) == 1:
+                values.append(members[0])
+            else:
+                values.extend(members)
+                groups.append(members)
+    return values, groups
+
+
 def generalize_string(s):
+    import unicodedata
     normalized = unicodedata.normalize('NFD', s)
     stripped = ''.join(
         c for c in normalized if unicodedata.category(c) != 'Mn')
     return unicodedata.normalize('NFC', stripped)
 
 
-def parse_placeholders(pattern):
+MASK_CHARSETS = {
+    'l': 'abcdefghijklmnopqrstuvwxyz',
+    'u': 'ABCDEFGHIJKLMNOPQRSTUVWXYZ',
+    'd': '0123456789',
+    's': ' !"#$%&\'()*+,-./:;<=>?@[\\]^_`{|}~',
+}
+MASK_CHARSETS['a'] = ''.join(MASK_CHARSETS[c] for c in 'luds')
+
+
+def expand_charset(value):
+    out = []
+    i = 0
+    while i < len(value):
+        if value[i] == '?' and i + 1 < len(value):
+            ref = value[i + 1]
+            out.append('?' if ref == '?' else MASK_CHARSETS.get(ref, '?' + ref))
+            i += 2
+        else:
+            out.append(value[i])
+            i += 1
+    return ''.join(dict.fromkeys(''.join(out)))
+
+
+def parse_mask(spec, charsets=None):
+    positions = []
+    for m in re.finditer(r'\?(.)(\d*)|(.)', spec):
+        ref, count, literal = m.groups()
+        if literal is not None:
+            raise ValueError(f"Invalid mask {spec!r}: expected ?x at {literal!r}")
+        if ref in MASK_CHARSETS:
+            charset = MASK_CHARSETS[ref]
+        elif charsets and ref in charsets:
+            charset = charsets[ref]
+        else:
+            raise ValueError(f"Unknown mask charset ?{ref}")
+        positions.extend([charset] * int(count or 1))
+    return tuple(positions)
+
+
+def parse_placeholders(pattern, charsets=None):
     tokens = []
     for m in re.finditer(r"\{(.*?)\}", pattern):
         name = m.group(1)
@@ -41,79 +110,1282 @@ def parse_placeholders(pattern):
             tokens.append((name, 'number', None))
         elif base == 'special':
             tokens.append((name, 'special', None))
+        elif name.startswith('mask:'):
+            tokens.append((name, 'mask', parse_mask(name[5:], charsets)))
     return tokens
 
 
+def apply_case(val, case):
+    if case is None or case == 'any':
+        return val
+    return val.upper() if case == 'upper' else val.capitalize(
+    ) if case == 'capitalize' else val.lower()
+
+
 def fill_pattern(pattern, tokens, values):
     out = pattern
     for (name, kind, case), val in zip(tokens, values):
-        if kind == 'word' and case != 'any':
-            val = val.upper() if case == 'upper' else val.capitalize(
-            ) if case == 'capitalize' else val.lower()
+        if kind == 'word':
+            val = apply_case(val, case)
         out = out.replace(f"{{{name}}}", val, 1)
     return out
 
 
-def generate_passwords(patterns, words, numbers, specials):
-    results = set()
-    for pat in patterns:
-        tokens = parse_placeholders(pat)
-        pools = []
-        for name, kind, case in tokens:
-            base_pool = {'word': words, 'number': numbers,
-                         'special': specials}[kind]
-            if kind == 'word' and case == 'any':
-                variants = set()
-                for w in base_pool:
-                    variants.add(w.lower())
-                    variants.add(w.capitalize())
-                    variants.add(w.upper())
-                pools.append(list(variants))
+class MaskPool:
+    """Lazy pool of every string matching a mask, one charset per position.
+
+    Values are enumerated odometer-style (last position fastest) and can be
+    addressed by index without materializing the pool.
+    """
+
+    def __init__(self, charsets):
+        self.charsets = tuple(charsets)
+        self._size = keyspace_size(self.charsets)
+
+    def __eq__(self, other):
+        return isinstance(other, MaskPool) and other.charsets == self.charsets
+
+    def __hash__(self):
+        return hash(self.charsets)
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return map(''.join, itertools.product(*self.charsets))
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError('mask index out of range')
+        out = []
+        for charset in reversed(self.charsets):
+            index, digit = divmod(index, len(charset))
+            out.append(charset[digit])
+        return ''.join(reversed(out))
+
+    def profile(self):
+        must = may = 0
+        for charset in self.charsets:
+            masks = [char_classes(c) for c in charset]
+            common = masks[0] if masks else 0
+            for m in masks:
+                common &= m
+                may |= m
+            must |= common
+        return [(len(self.charsets), must, may)]
+
+    def length_histogram(self):
+        return {len(self.charsets): self._size}
+
+
+class RangePool:
+    """Lazy pool of the integers ``low..high`` as decimal strings.
+
+    With ``width`` every value is zero-padded to that many digits, so
+    ``0000-9999`` covers all four-digit PINs.
+    """
+
+    def __init__(self, low, high, width=0):
+        if low > high:
+            raise ValueError(f"Empty number range: {low}-{high}")
+        self.low = low
+        self.high = high
+        self.width = width
+
+    def __len__(self):
+        return self.high - self.low + 1
+
+    def __iter__(self):
+        values = range(self.low, self.high + 1)
+        if self.width:
+            return (f'{v:0{self.width}d}' for v in values)
+        return map(str, values)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('range index out of range')
+        if self.width:
+            return f'{self.low + index:0{self.width}d}'
+        return str(self.low + index)
+
+    def _spans(self):
+        if self.width:
+            yield max(self.width, len(str(self.high))), self.low, self.high
+            return
+        for n in range(len(str(self.low)), len(str(self.high)) + 1):
+            first = max(self.low, 10 ** (n - 1) if n > 1 else 0)
+            last = min(self.high, 10 ** n - 1)
+            yield n, first, last
+
+    def profile(self):
+        return [(n, CHAR_CLASSES['digit'], CHAR_CLASSES['digit'])
+                for n, _, _ in self._spans()]
+
+    def length_histogram(self):
+        return {n: last - first + 1 for n, first, last in self._spans()}
+
+    def restrict(self, lengths):
+        parts = [RangePool(first, last, self.width)
+                 for n, first, last in self._spans() if n in lengths]
+        return parts[0] if len(parts) == 1 else ChainPool(parts)
+
+
+class DatePool:
+    """Lazy pool of every calendar day in ``first..last`` years, formatted.
+
+    ``fmt`` combines ``dd``, ``mm``, ``yy`` and ``yyyy`` with literal
+    separators, e.g. ``ddmmyy`` or ``dd.mm.yyyy``. Without a year token the
+    days of a single leap year are used. A format without ``dd`` steps by
+    month and one without ``mm`` by day of the month (01-31), so no value
+    repeats.
+    """
+
+    FIELDS = {'dd': '{0.day:02d}', 'mm': '{0.month:02d}',
+              'yyyy': '{0.year:04d}', 'yy': '{1:02d}'}
+
+    def __init__(self, fmt, first, last):
+        import datetime
+        tokens = re.findall(r'yyyy|yy|dd|mm|.', fmt)
+        if not {'dd', 'mm'} & set(tokens):
+            raise ValueError(f"Date format needs dd or mm: {fmt}")
+        if not {'yy', 'yyyy'} & set(tokens):
+            first = last = 2000
+        if first > last:
+            raise ValueError(f"Empty year range: {first}..{last}")
+        self.fmt = fmt
+        self.first = first
+        self.last = last
+        self._template = ''.join(
+            self.FIELDS.get(t) or t.replace('{', '{{').replace('}', '}}')
+            for t in tokens)
+        self._date = datetime.date
+        years = last - first + 1
+        if 'dd' not in tokens:
+            self._per_year = 12
+        elif 'mm' not in tokens:
+            self._per_year = 31
+        else:
+            self._per_year = None
+        if self._per_year:
+            self._size = years * self._per_year
+        else:
+            self._start = datetime.date(first, 1, 1).toordinal()
+            self._size = datetime.date(last, 12, 31).toordinal() - \
+                self._start + 1
+        self._length = len(self[0])
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return map(self.__getitem__, range(self._size))
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError('date index out of range')
+        if self._per_year == 12:
+            year, month = divmod(index, 12)
+            day = self._date(self.first + year, month + 1, 1)
+        elif self._per_year == 31:
+            # January has every day of the month
+            year, d = divmod(index, 31)
+            day = self._date(self.first + year, 1, d + 1)
+        else:
+            day = self._date.fromordinal(self._start + index)
+        return self._template.format(day, day.year % 100)
+
+    def profile(self):
+        mask = char_classes(self[0])
+        return [(self._length, mask, mask)]
+
+    def length_histogram(self):
+        return {self._length: self._size}
+
+
+class ChainPool:
+    """Lazy concatenation of literal value lists and lazy pools."""
+
+    def __init__(self, parts):
+        self.parts = [part for part in parts if len(part)]
+        self._offsets = list(itertools.accumulate(
+            (len(part) for part in self.parts), initial=0))
+
+    def __len__(self):
+        return self._offsets[-1]
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.parts)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('pool index out of range')
+        i = bisect.bisect_right(self._offsets, index) - 1
+        return self.parts[i][index - self._offsets[i]]
+
+    def profile(self):
+        profile = []
+        for part in self.parts:
+            if is_lazy(part):
+                profile.extend(part.profile())
+                continue
+            by_length = {}
+            for v in part:
+                mask = char_classes(v)
+                must, may = by_length.get(len(v), (mask, mask))
+                by_length[len(v)] = (must & mask, may | mask)
+            profile.extend((n, must, may)
+                           for n, (must, may) in by_length.items())
+        return profile
+
+    def length_histogram(self):
+        histogram = {}
+        for part in self.parts:
+            counts = part.length_histogram() if is_lazy(part) else \
+                {n: sum(1 for v in part if len(v) == n)
+                 for n in {len(v) for v in part}}
+            for n, count in counts.items():
+                histogram[n] = histogram.get(n, 0) + count
+        return histogram
+
+    def restrict(self, lengths):
+        parts = []
+        for part in self.parts:
+            if not is_lazy(part):
+                parts.append([v for v in part if len(v) in lengths])
+                continue
+            have = {n for n, _, _ in part.profile()}
+            if have <= lengths:
+                parts.append(part)
+            elif have & lengths and hasattr(part, 'restrict'):
+                parts.append(part.restrict(lengths))
+        return ChainPool(parts)
+
+
+def parse_number_spec(item):
+    m = re.match(r'range:(\d+)-(\d+)$', item)
+    if m:
+        low, high = m.groups()
+        width = len(low) if low.startswith('0') and len(low) > 1 \
+            and len(low) == len(high) else 0
+        return RangePool(int(low), int(high), width)
+    if item.startswith('range:'):
+        raise ValueError(f"Invalid range spec: {item}")
+    m = re.match(r'date:([^:]+):(\d{4})(?:\.\.(\d{4}))?$', item)
+    if m:
+        fmt, first, last = m.groups()
+        return DatePool(fmt, int(first), int(last or first))
+    if item.startswith('date:'):
+        raise ValueError(f"Invalid date spec: {item}")
+    return None
+
+
+def build_number_pool(numbers):
+    if hasattr(numbers, 'profile') or isinstance(numbers, PackedPool):
+        return numbers
+    parts = []
+    literal = []
+    for item in numbers:
+        pool = parse_number_spec(item)
+        if pool is None:
+            literal.append(item)
+            continue
+        if literal:
+            parts.append(literal)
+            literal = []
+        parts.append(pool)
+    if not parts:
+        return literal
+    if literal:
+        parts.append(literal)
+    return ChainPool(parts)
+
+
+class PackedPool:
+    """Read-only sequence of strings packed into one contiguous UTF-8 buffer.
+
+    Values are addressed through an offsets array, with each value's group
+    id (-1 when ungrouped) kept in a parallel array. A
+    pool can be published with ``share()`` and rebuilt in another process
+    with ``attach()``, which maps the same memory instead of copying it.
+    """
+
+    HEADER = struct.Struct('<QQ')
+
+    def __init__(self, values=(), group_ids=None):
+        encoded = [v.encode('utf-8') for v in values]
+        self._buffer = b''.join(encoded)
+        self.offsets = array('q', itertools.accumulate(map(len, encoded),
+                                                       initial=0))
+        self.group_ids = array('q', group_ids if group_ids is not None
+                               else [-1] * len(encoded))
+        if len(self.group_ids) != len(encoded):
+            raise ValueError('group_ids must have one entry per value')
+        self._shm = None
+
+    @classmethod
+    def from_groups(cls, values, groups=(), fold_case=False):
+        index = index_groups(groups, fold_case)
+        ids = [index.get(v.lower() if fold_case else v, (-1,))[0]
+               for v in values]
+        return cls(values, ids)
+
+    def __len__(self):
+        return len(self.group_ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('pool index out of range')
+        return str(self._buffer[self.offsets[index]:self.offsets[index + 1]],
+                   'utf-8')
+
+    def __iter__(self):
+        buffer = self._buffer
+        offsets = self.offsets
+        for i in range(len(self)):
+            yield str(buffer[offsets[i]:offsets[i + 1]], 'utf-8')
+
+    @property
+    def nbytes(self):
+        return (len(self._buffer) + self.offsets.itemsize * len(self.offsets)
+                + self.group_ids.itemsize * len(self.group_ids))
+
+    def groups(self):
+        groups = {}
+        for v, gid in zip(self, self.group_ids):
+            if gid >= 0:
+                groups.setdefault(gid, []).append(v)
+        return list(groups.values())
+
+    def share(self):
+        """Copy the pool into shared memory and return ``(shm, name)``.
+
+        The caller owns the segment and must ``close()`` and ``unlink()`` it
+        once every attached process is done.
+        """
+        from multiprocessing import shared_memory
+
+        n = len(self)
+        parts = [self.HEADER.pack(n, len(self._buffer)),
+                 self.offsets.tobytes(), self.group_ids.tobytes(),
+                 bytes(self._buffer)]
+        shm = shared_memory.SharedMemory(create=True,
+                                         size=max(sum(map(len, parts)), 1))
+        pos = 0
+        for part in parts:
+            shm.buf[pos:pos + len(part)] = part
+            pos += len(part)
+        return shm, shm.name
+
+    @classmethod
+    def attach(cls, name):
+        """Map a pool published with ``share()`` without copying it."""
+        from multiprocessing import shared_memory
+
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before Python 3.13 attaching registers the segment again;
+            # worker processes share the creator's resource tracker, so the
+            # creator's unlink() still clears it
+            shm = shared_memory.SharedMemory(name=name)
+        n, size = cls.HEADER.unpack_from(shm.buf)
+        view = shm.buf
+        pos = cls.HEADER.size
+        pool = cls.__new__(cls)
+        pool.offsets = view[pos:pos + 8 * (n + 1)].cast('q')
+        pos += 8 * (n + 1)
+        pool.group_ids = view[pos:pos + 8 * n].cast('q')
+        pos += 8 * n
+        pool._buffer = view[pos:pos + size]
+        pool._shm = shm
+        return pool
+
+    def close(self):
+        """Release an attached pool's mapping of the shared segment."""
+        if self._shm is not None:
+            for name in ('offsets', 'group_ids', '_buffer'):
+                getattr(self, name).release()
+            self._shm.close()
+            self._shm = None
+
+
+def is_lazy(pool):
+    return not isinstance(pool, (list, tuple, PackedPool))
+
+
+def pattern_pools(tokens, words, numbers, specials):
+    pools = []
+    for name, kind, case in tokens:
+        if kind == 'mask':
+            pools.append(MaskPool(case))
+            continue
+        pools.append({'word': words, 'number': numbers,
+                      'special': specials}[kind])
+    return pools
+
+
+def keyspace_size(pools):
+    size = 1
+    for pool in pools:
+        size *= len(pool)
+    return size
+
+
+# Case variants of a '*' word slot, enumerated per word in this order
+ANY_CASES = ('lower', 'capitalize', 'upper')
+
+
+def slot_cases(kind, case):
+    return ANY_CASES if kind == 'word' and case == 'any' else (case,)
+
+
+def keyspace_layout(tokens, pools):
+    """Return ``(size, strides, perm)`` for one pattern's keyspace.
+
+    Slot values are numbered word-major with case variants as the minor
+    digit. When every word slot draws from the same list of distinct words,
+    those slots are laid out as k-permutations (``perm`` holds their
+    indices), so no index maps to a repeated word; otherwise the layout is
+    the plain product of the slot sizes. ``strides[d]`` is the number of
+    completions below one value at depth ``d``; the last slot varies
+    fastest.
+    """
+    cases = [len(slot_cases(kind, case)) for _, kind, case in tokens]
+    words = [j for j, (_, kind, _) in enumerate(tokens) if kind == 'word']
+    perm = ()
+    if len(words) > 1:
+        base = pools[words[0]]
+        if all(pools[j] is base or list(pools[j]) == list(base)
+               for j in words[1:]) and len(set(base)) == len(base):
+            perm = tuple(words)
+
+    k = len(tokens)
+    strides = [1] * k
+    size = 1
+    n = len(pools[perm[0]]) if perm else 0
+    used = len(perm)
+    for d in range(k - 1, -1, -1):
+        strides[d] = size
+        if d in perm:
+            used -= 1
+            size *= max(n - used, 0) * cases[d]
+        else:
+            size *= len(pools[d]) * cases[d]
+    return size, strides, perm
+
+
+def index_groups(groups, fold_case=False):
+    """Map each group member to the ids of every group it belongs to."""
+    index = {}
+    for gid, group in enumerate(groups):
+        if len(group) < 2:
+            continue
+        for value in group:
+            ids = index.setdefault(value.lower() if fold_case else value, ())
+            if gid not in ids:
+                index[value.lower() if fold_case else value] = ids + (gid,)
+    return index
+
+
+def pattern_tags(tokens, pools, word_index, number_index, special_index):
+    indexes = {'word': word_index, 'number': number_index,
+               'special': special_index}
+    tags = []
+    for (name, kind, case), pool in zip(tokens, pools):
+        index = indexes.get(kind)
+        if not index:
+            tags.append(None)
+            continue
+        if is_lazy(pool):
+            # Lazy slots look values up by member instead of by position
+            tags.append({member: (tuple((kind, gid) for gid in ids), member)
+                         for member, ids in index.items()})
+            continue
+        slot = []
+        for v in pool:
+            member = v.lower() if kind == 'word' else v
+            ids = index.get(member)
+            slot.append(None if ids is None else
+                        (tuple((kind, gid) for gid in ids), member))
+        tags.append(slot if any(slot) else None)
+    return tags
+
+
+def has_conflict(combo_tags):
+    seen = {}
+    for tag in combo_tags:
+        if tag is not None:
+            keys, member = tag
+            for key in keys:
+                if seen.setdefault(key, member) != member:
+                    return True
+    return False
+
+
+def claim_groups(groups, tag):
+    """Claim a tag's groups for its member.
+
+    Returns the newly claimed keys, to be released on backtrack, or None
+    when another member already holds one of the groups.
+    """
+    keys, member = tag
+    claimed = []
+    for key in keys:
+        held = groups.get(key)
+        if held is None:
+            claimed.append(key)
+        elif held != member:
+            return None
+    for key in claimed:
+        groups[key] = member
+    return claimed
+
+
+def pattern_segments(pattern, tokens):
+    segments = []
+    pos = 0
+    names = iter(name for name, _, _ in tokens)
+    expected = next(names, None)
+    for m in re.finditer(r"\{(.*?)\}", pattern):
+        if m.group(1) == expected:
+            segments.append(pattern[pos:m.start()])
+            pos = m.end()
+            expected = next(names, None)
+    segments.append(pattern[pos:])
+    return segments
+
+
+def slot_entries(kind, case, pool, tags=None, keep_positions=False):
+    """Return ``(text, length, word, tag)`` for each value of one slot.
+
+    Case variants that repeat an earlier variant of the same word (e.g. for
+    digits) are dropped, or with ``keep_positions`` kept as ``None`` text so
+    that entries still line up with the keyspace layout.
+    """
+    entries = []
+    cases = slot_cases(kind, case)
+    for i, v in enumerate(pool):
+        tag = tags[i] if tags else None
+        if kind != 'word':
+            entries.append((v, len(v), None, tag))
+            continue
+        seen = set()
+        for c in cases:
+            text = apply_case(v, c)
+            if text in seen:
+                if keep_positions:
+                    entries.append((None, 0, v, tag))
+                continue
+            seen.add(text)
+            entries.append((text, len(text), v, tag))
+    return entries
+
+
+def _lazy_entries(pool, start=0, stop=None, tags=None):
+    if start == 0 and stop is None:
+        values = iter(pool)
+    else:
+        values = (pool[i] for i in range(start, stop))
+    if tags:
+        for v in values:
+            yield v, len(v), None, tags.get(v)
+    else:
+        for v in values:
+            yield v, len(v), None, None
+
+
+def pattern_slots(tokens, pools, tags=None):
+    """Return ``(slots, lazy_tags, lo, hi)`` as walked by ``iter_pattern``.
+
+    List slots become their ``slot_entries`` (positions kept), lazy slots
+    stay as they are. Reusable across ``iter_pattern`` calls on the same
+    pattern.
+    """
+    slots = []
+    lazy_tags = []
+    lo = []
+    hi = []
+    for j, ((name, kind, case), pool) in enumerate(zip(tokens, pools)):
+        lazy_tags.append(tags[j] if tags and is_lazy(pool) else None)
+        if is_lazy(pool):
+            slots.append(pool)
+            lengths = [entry[0] for entry in pool.profile()]
+        else:
+            entries = slot_entries(kind, case, pool,
+                                   tags[j] if tags else None,
+                                   keep_positions=True)
+            slots.append(entries)
+            lengths = [entry[1] for entry in entries
+                       if entry[0] is not None] or [0]
+        lo.append(min(lengths))
+        hi.append(max(lengths))
+    return slots, lazy_tags, lo, hi
+
+
+def iter_pattern(pat, tokens, pools, tags=None, min_len=0, max_len=None,
+                 start=0, stop=None, layout=None, slots=None):
+    segments = pattern_segments(pat, tokens)
+    if max_len is None:
+        max_len = float('inf')
+    if not tokens:
+        if start < (1 if stop is None else stop) and \
+                min_len <= len(segments[0]) <= max_len:
+            yield segments[0]
+        return
+
+    slots, lazy_tags, lo, hi = slots or pattern_slots(tokens, pools, tags)
+    size, strides, perm = layout or keyspace_layout(tokens, pools)
+    if not size:
+        return
+
+    # Shortest/longest completion after each slot, literals included
+    k = len(slots)
+    rest_lo = [len(segments[-1])] * k
+    rest_hi = [len(segments[-1])] * k
+    for d in range(k - 1, 0, -1):
+        rest_lo[d - 1] = rest_lo[d] + lo[d] + len(segments[d])
+        rest_hi[d - 1] = rest_hi[d] + hi[d] + len(segments[d])
+
+    if stop is None:
+        stop = size
+
+    used_words = set()
+    groups = {}
+
+    def walk(d, prefix, offset, clip):
+        slot = slots[d]
+        seg = segments[d + 1]
+        base = len(prefix)
+        low = min_len - base - rest_hi[d]
+        high = max_len - base - rest_lo[d]
+        if high < lo[d] or low > hi[d]:
+            return
+        stride = strides[d]
+        first = 0
+        last = None
+        if clip:
+            first = max(0, (start - offset) // stride)
+            last = -(-(stop - offset) // stride)
+        if d in perm:
+            # Positions count only the words still unused at this depth
+            entries = (entry for entry in slot if entry[2] not in used_words)
+            if clip:
+                entries = itertools.islice(entries, first, last)
+        elif is_lazy(slot):
+            entries = _lazy_entries(slot, first, min(len(slot), last),
+                                    lazy_tags[d]) if clip else \
+                _lazy_entries(slot, tags=lazy_tags[d])
+        else:
+            entries = slot[first:last] if clip else slot
+        leaf = d == k - 1
+        for i, (text, n, word, tag) in enumerate(entries, first):
+            if text is None or not low <= n <= high:
+                continue
+            if word is not None and word in used_words:
+                continue
+            claimed = None
+            if tag is not None:
+                claimed = claim_groups(groups, tag)
+                if claimed is None:
+                    continue
+            if leaf:
+                yield prefix + text + seg
             else:
-                pools.append(base_pool)
+                if word is not None:
+                    used_words.add(word)
+                child = offset + i * stride
+                inside = start <= child and child + stride <= stop
+                yield from walk(d + 1, prefix + text + seg, child,
+                                clip and not inside)
+                if word is not None:
+                    used_words.discard(word)
+            if claimed:
+                for key in claimed:
+                    del groups[key]
+
+    yield from walk(0, segments[0], 0, start > 0 or stop < size)
+
+
+def unrank_pattern(pat, tokens, pools, tags, index, segments=None,
+                   layout=None):
+    """Return the candidate at ``index`` of one pattern's keyspace.
+
+    Uses the same layout as ``iter_pattern`` (see ``keyspace_layout``).
+    Returns None when the combination repeats a word, uses a case variant
+    equal to an earlier one of the same word, or breaks a group rule;
+    length and policy checks are left to the caller.
+    """
+    if segments is None:
+        segments = pattern_segments(pat, tokens)
+    size, strides, perm = layout or keyspace_layout(tokens, pools)
+
+    out = [segments[0]]
+    used = []
+    used_words = set()
+    combo_tags = []
+    for j, ((name, kind, case), pool) in enumerate(zip(tokens, pools)):
+        digit, index = divmod(index, strides[j])
+        cases = slot_cases(kind, case)
+        i, variant = divmod(digit, len(cases))
+        if j in perm:
+            # The i-th word not taken by an earlier slot
+            for u in sorted(used):
+                if u <= i:
+                    i += 1
+            used.append(i)
+        v = pool[i]
+        if kind == 'word':
+            if v in used_words:
+                return None
+            text = apply_case(v, cases[variant])
+            if any(apply_case(v, c) == text for c in cases[:variant]):
+                return None
+            used_words.add(v)
+            out.append(text)
+        else:
+            out.append(v)
+        out.append(segments[j + 1])
+        slot_tags = tags[j] if tags else None
+        if slot_tags:
+            combo_tags.append(slot_tags.get(v) if isinstance(slot_tags, dict)
+                              else slot_tags[i])
+    if has_conflict(combo_tags):
+        return None
+    return ''.join(out)
+
+
+class _TrieNode:
+    __slots__ = ('seg', 'kind', 'entries', 'tags', 'lo', 'hi', 'children',
+                 'ends', 'rest_lo', 'rest_hi')
+
+    def __init__(self, seg='', entries=(), lo=0, hi=0, tags=None, kind=None):
+        self.seg = seg
+        self.kind = kind
+        self.entries = entries
+        self.tags = tags
+        self.lo = lo
+        self.hi = hi
+        self.children = {}
+        self.ends = []
+        self.rest_lo = self.rest_hi = 0
+
 
-        for combo in itertools.product(*pools):
-            word_vals = [v for (n, k, _), v in zip(
-                tokens, combo) if k == 'word']
-            if len(word_vals) != len(set(word_vals)):
+def build_pattern_trie(compiled):
+    root = _TrieNode()
+    interned = {}
+    for pat, tokens, pools, tags, residual in compiled:
+        segments = pattern_segments(pat, tokens)
+        node = root
+        for j, ((name, kind, case), pool) in enumerate(zip(tokens, pools)):
+            pool_key = pool if is_lazy(pool) else tuple(pool)
+            key = (segments[j], kind, case, pool_key)
+            child = node.children.get(key)
+            if child is None:
+                if is_lazy(pool):
+                    entries = pool
+                    lengths = [entry[0] for entry in pool.profile()]
+                else:
+                    entries = interned.get(key)
+                    if entries is None:
+                        entries = slot_entries(kind, case, pool,
+                                               tags[j] if tags else None)
+                        interned[key] = entries
+                    lengths = [entry[1] for entry in entries] or [0]
+                child = _TrieNode(segments[j], entries, min(lengths),
+                                  max(lengths),
+                                  tags[j] if tags and is_lazy(pool) else None,
+                                  kind)
+                node.children[key] = child
+            node = child
+        node.ends.append((segments[-1], residual))
+
+    def measure(node):
+        lows = [len(tail) for tail, _ in node.ends]
+        highs = list(lows)
+        for child in node.children.values():
+            measure(child)
+            lows.append(len(child.seg) + child.lo + child.rest_lo)
+            highs.append(len(child.seg) + child.hi + child.rest_hi)
+        node.rest_lo = min(lows, default=0)
+        node.rest_hi = max(highs, default=0)
+    measure(root)
+    return root
+
+
+def iter_trie(root, min_len=0, max_len=None, provenance=False):
+    """Yield the candidates of a pattern trie.
+
+    With ``provenance`` each candidate comes as ``(pw, values)``, where
+    ``values`` holds a ``(kind, value)`` pair per slot (the uncased word for
+    word slots).
+    """
+    if max_len is None:
+        max_len = float('inf')
+    used_words = set()
+    groups = {}
+    trail = []
+
+    def walk(node, prefix):
+        for child in node.children.values():
+            head = prefix + child.seg
+            low = min_len - len(head) - child.rest_hi
+            high = max_len - len(head) - child.rest_lo
+            if high < child.lo or low > child.hi:
                 continue
-            results.add(fill_pattern(pat, tokens, combo))
-    return results
+            entries = child.entries
+            if is_lazy(entries):
+                entries = _lazy_entries(entries, tags=child.tags)
+            # A leaf with a single unconditional end needs no checks:
+            # the length window above is already exact for it
+            leaf = None
+            if not child.children and len(child.ends) == 1 \
+                    and not child.ends[0][1]:
+                leaf = child.ends[0][0]
+            for text, n, word, tag in entries:
+                if not low <= n <= high:
+                    continue
+                if word is not None and word in used_words:
+                    continue
+                claimed = None
+                if tag is not None:
+                    claimed = claim_groups(groups, tag)
+                    if claimed is None:
+                        continue
+                if provenance:
+                    trail.append((child.kind, text if word is None else word))
+                if leaf is not None:
+                    if provenance:
+                        yield head + text + leaf, tuple(trail)
+                        trail.pop()
+                    else:
+                        yield head + text + leaf
+                    if claimed:
+                        for key in claimed:
+                            del groups[key]
+                    continue
+                value = head + text
+                for tail, residual in child.ends:
+                    pw = value + tail
+                    if min_len <= len(pw) <= max_len and (
+                            not residual
+                            or char_classes(pw) & residual == residual):
+                        yield (pw, tuple(trail)) if provenance else pw
+                if child.children:
+                    if word is not None:
+                        used_words.add(word)
+                    yield from walk(child, value)
+                    if word is not None:
+                        used_words.discard(word)
+                if provenance:
+                    trail.pop()
+                if claimed:
+                    for key in claimed:
+                        del groups[key]
 
+    for tail, residual in root.ends:
+        if min_len <= len(tail) <= max_len and (
+                not residual or char_classes(tail) & residual == residual):
+            yield (tail, ()) if provenance else tail
+    yield from walk(root, '')
 
-def filter_passwords(candidates, min_len, max_len, word_groups, number_groups, special_groups):
-    filtered = []
-    for pw in candidates:
+
+def iter_passwords(patterns, words, numbers, specials, word_groups=(),
+                   number_groups=(), special_groups=(), charsets=None):
+    word_index = index_groups(word_groups, fold_case=True)
+    number_index = index_groups(number_groups)
+    special_index = index_groups(special_groups)
+    charsets = {k: expand_charset(v) for k, v in (charsets or {}).items()}
+    for pat in patterns:
+        tokens = parse_placeholders(pat, charsets)
+        pools = pattern_pools(tokens, words, numbers, specials)
+        tags = pattern_tags(tokens, pools, word_index, number_index,
+                            special_index)
+        yield from iter_pattern(pat, tokens, pools, tags)
+
+
+def generate_passwords(patterns, words, numbers, specials, word_groups=(),
+                       number_groups=(), special_groups=(), charsets=None):
+    return set(iter_passwords(patterns, words, numbers, specials, word_groups,
+                              number_groups, special_groups, charsets))
+
+
+def make_filter(min_len, max_len, word_groups, number_groups=(), special_groups=()):
+    word_groups = [[w.lower() for w in group]
+                   for group in word_groups if len(group) > 1]
+    number_groups = [group for group in number_groups if len(group) > 1]
+    special_groups = [group for group in special_groups if len(group) > 1]
+
+    def keep(pw):
         if not (min_len <= len(pw) <= max_len):
-            continue
+            return False
         low = pw.lower()
 
         # Check word conflicts
-        word_conflict = any(
-            sum(1 for w in group if w.lower() in low) > 1
-            for group in word_groups if len(group) > 1
-        )
-        if word_conflict:
-            continue
+        if any(sum(1 for w in group if w in low) > 1 for group in word_groups):
+            return False
 
         # Check number conflicts
-        number_conflict = any(
-            sum(1 for n in group if n in pw) > 1
-            for group in number_groups if len(group) > 1
-        )
-        if number_conflict:
-            continue
+        if any(sum(1 for n in group if n in pw) > 1 for group in number_groups):
+            return False
 
         # Check special character conflicts
-        special_conflict = any(
-            sum(1 for s in group if s in pw) > 1
-            for group in special_groups if len(group) > 1
-        )
-        if special_conflict:
+        if any(sum(1 for c in group if c in pw) > 1 for group in special_groups):
+            return False
+
+        return True
+    return keep
+
+
+def filter_passwords(candidates, min_len, max_len, word_groups, number_groups=(), special_groups=()):
+    keep = make_filter(min_len, max_len, word_groups,
+                       number_groups, special_groups)
+    return [pw for pw in candidates if keep(pw)]
+
+
+CHAR_CLASSES = {'lower': 1, 'upper': 2, 'digit': 4, 'special': 8}
+
+
+def char_classes(s):
+    mask = 0
+    for c in s:
+        if c.islower():
+            mask |= 1
+        elif c.isupper():
+            mask |= 2
+        elif c.isdigit():
+            mask |= 4
+        elif not c.isalpha():
+            mask |= 8
+    return mask
+
+
+def parse_policy(value):
+    policy = {'classes': 0, 'min_length': None, 'max_length': None}
+    for item in value.split(','):
+        item = item.strip().lower()
+        if not item:
             continue
+        if item.rstrip('s') in CHAR_CLASSES:
+            policy['classes'] |= CHAR_CLASSES[item.rstrip('s')]
+        elif re.match(r'\d+-\d+$', item):
+            low, high = item.split('-')
+            policy['min_length'], policy['max_length'] = int(low), int(high)
+        elif re.match(r'(min|max)=\d+$', item):
+            key, n = item.split('=')
+            policy[f'{key}_length'] = int(n)
+        else:
+            raise ValueError(f"Unsupported policy rule: {item}")
+    if None not in (policy['min_length'], policy['max_length']) and \
+            policy['min_length'] > policy['max_length']:
+        raise ValueError(
+            f"Policy minimum length {policy['min_length']} exceeds maximum {policy['max_length']}")
+    return policy
+
+
+def slot_profile(pool, kind, case):
+    if is_lazy(pool):
+        return pool.profile()
+    cases = slot_cases(kind, case)
+    profile = []
+    for v in pool:
+        if kind != 'word':
+            mask = char_classes(v)
+            profile.append((len(v), mask, mask))
+            continue
+        must = ~0
+        may = 0
+        for c in cases:
+            mask = char_classes(apply_case(v, c))
+            must &= mask
+            may |= mask
+        profile.append((len(apply_case(v, cases[0])), must, may))
+    return profile
+
 
-        filtered.append(pw)
-    return filtered
+def prune_pattern(pat, tokens, pools, tags, min_len, max_len, classes=0):
+    static = fill_pattern(pat, tokens, [''] * len(tokens))
+    profiles = [slot_profile(pool, kind, case)
+                for (name, kind, case), pool in zip(tokens, pools)]
+    keep = [range(len(profile)) for profile in profiles]
+
+    changed = True
+    while changed:
+        if not all(keep):
+            return None
+        lo = [min(prof[i][0] for i in k) for prof, k in zip(profiles, keep)]
+        hi = [max(prof[i][0] for i in k) for prof, k in zip(profiles, keep)]
+        total_lo = len(static) + sum(lo)
+        total_hi = len(static) + sum(hi)
+        changed = False
+        for j, prof in enumerate(profiles):
+            room_hi = max_len - (total_lo - lo[j])
+            room_lo = min_len - (total_hi - hi[j])
+            narrowed = [i for i in keep[j]
+                        if room_lo <= prof[i][0] <= room_hi]
+            if len(narrowed) != len(keep[j]):
+                keep[j] = narrowed
+                changed = True
+
+    residual = 0
+    missing = classes & ~char_classes(static)
+    for bit in CHAR_CLASSES.values():
+        if not missing & bit:
+            continue
+        if any(all(prof[i][1] & bit for i in k)
+               for prof, k in zip(profiles, keep)):
+            continue
+        if not any(prof[i][2] & bit for prof, k in zip(profiles, keep)
+                   for i in k):
+            return None
+        residual |= bit
+
+    narrowed_pools = []
+    for pool, prof, k in zip(pools, profiles, keep):
+        if len(k) == len(prof):
+            narrowed_pools.append(pool)
+        elif is_lazy(pool):
+            narrowed_pools.append(pool.restrict({prof[i][0] for i in k})
+                                  if hasattr(pool, 'restrict') else pool)
+        else:
+            narrowed_pools.append([pool[i] for i in k])
+    tags = tags and [t if t is None or isinstance(t, dict) or len(k) == len(t)
+                     else [t[i] for i in k] for t, k in zip(tags, keep)]
+    return narrowed_pools, tags, residual
+
+
+class Weaver:
+    """Lazy candidate generator over placeholder patterns and value pools.
+
+    Iterating yields the candidates that pass the length, group and policy
+    rules. Patterns are merged into a trie so a prefix shared by several
+    patterns is enumerated once; ``iter_range`` walks the keyspace pattern
+    by pattern instead. Patterns and pool values that cannot meet
+    the length bounds or the policy are pruned up front; ``len()`` is the
+    size of the remaining keyspace, without repeated words but still
+    counting combinations that the length, group and policy checks reject.
+    """
+
+    def __init__(self, patterns, words=(), numbers=(), specials=(),
+                 min_length=1, max_length=100, word_groups=(),
+                 number_groups=(), special_groups=(), policy=None,
+                 charsets=None):
+        self.patterns = list(patterns)
+        self.words = words if isinstance(words, PackedPool) else \
+            list(dict.fromkeys(words))
+        self.numbers = build_number_pool(numbers)
+        self.specials = specials if isinstance(specials, PackedPool) \
+            else list(specials)
+        self.min_length = min_length
+        self.max_length = max_length
+        self.word_groups = [list(g) for g in word_groups]
+        self.number_groups = [list(g) for g in number_groups]
+        self.special_groups = [list(g) for g in special_groups]
+        self.policy = policy
+        self.charsets = {k: expand_charset(v)
+                         for k, v in (charsets or {}).items()}
+        if policy:
+            if policy.get('min_length') is not None:
+                self.min_length = max(self.min_length, policy['min_length'])
+            if policy.get('max_length') is not None:
+                self.max_length = min(self.max_length, policy['max_length'])
+        classes = policy['classes'] if policy else 0
+        word_index = index_groups(self.word_groups, fold_case=True)
+        number_index = index_groups(self.number_groups)
+        special_index = index_groups(self.special_groups)
+        self._compiled = []
+        for pat in self.patterns:
+            tokens = parse_placeholders(pat, self.charsets)
+            pools = pattern_pools(tokens, self.words, self.numbers,
+                                  self.specials)
+            tags = pattern_tags(tokens, pools, word_index, number_index,
+                                special_index)
+            pruned = prune_pattern(pat, tokens, pools, tags, self.min_length,
+                                   self.max_length, classes)
+            if pruned is None:
+                logging.debug(f"Pattern {pat} cannot satisfy the constraints")
+                continue
+            pools, tags, residual = pruned
+            self._compiled.append((pat, tokens, pools, tags, residual))
+        self._layouts = [keyspace_layout(tokens, pools)
+                         for _, tokens, pools, _, _ in self._compiled]
+        self._offsets = list(itertools.accumulate(
+            (size for size, _, _ in self._layouts), initial=0))
+        self._segments = None
+        self._slots = [None] * len(self._compiled)
+
+    @classmethod
+    def from_dsl(cls, patterns, pattern_mode='as-is', **kwargs):
+        return cls(compile_patterns(patterns, pattern_mode), **kwargs)
+
+    def __len__(self):
+        return self._offsets[-1]
+
+    def __iter__(self):
+        return iter_trie(build_pattern_trie(self._compiled), self.min_length,
+                         self.max_length)
+
+    def iter_provenance(self):
+        """Like iterating, but yield ``(pw, values)`` with the slot values."""
+        return iter_trie(build_pattern_trie(self._compiled), self.min_length,
+                         self.max_length, provenance=True)
+
+    def iter_range(self, start, stop):
+        for p, ((pat, tokens, pools, tags, residual), layout, offset) in \
+                enumerate(zip(self._compiled, self._layouts, self._offsets)):
+            size = layout[0]
+            if offset < stop and start < offset + size:
+                candidates = iter_pattern(
+                    pat, tokens, pools, tags, self.min_length,
+                    self.max_length, max(start - offset, 0),
+                    min(stop - offset, size), layout, self._pattern_slots(p))
+                if residual:
+                    candidates = (pw for pw in candidates
+                                  if char_classes(pw) & residual == residual)
+                yield from candidates
+
+    def unique(self):
+        return set(self)
+
+    def _pattern_slots(self, p):
+        # Built on first use, then shared by every iter_range call
+        if self._slots[p] is None:
+            _, tokens, pools, tags, _ = self._compiled[p]
+            self._slots[p] = pattern_slots(tokens, pools, tags)
+        return self._slots[p]
+
+    def unrank(self, index):
+        """Return the candidate at keyspace ``index``, or None if rejected."""
+        if self._segments is None:
+            self._segments = [pattern_segments(pat, tokens)
+                              for pat, tokens, _, _, _ in self._compiled]
+        if not 0 <= index < self._offsets[-1]:
+            raise IndexError('keyspace index out of range')
+        p = bisect.bisect_right(self._offsets, index) - 1
+        pat, tokens, pools, tags, residual = self._compiled[p]
+        pw = unrank_pattern(pat, tokens, pools, tags,
+                            index - self._offsets[p], self._segments[p],
+                            self._layouts[p])
+        if pw is None or not self.min_length <= len(pw) <= self.max_length:
+            return None
+        if residual and char_classes(pw) & residual != residual:
+            return None
+        return pw
+
+    def sample(self, k, seed=None, max_tries=None):
+        """Draw up to ``k`` distinct candidates uniformly from the keyspace.
+
+        Random keyspace indices are unranked one by one and rejected when
+        the candidate fails the word, length, group or policy checks, so
+        the cost grows with ``k`` rather than with the keyspace. Gives up
+        after ``max_tries`` draws (default ``100 * k + 1000``), which only
+        matters when almost every combination is rejected.
+        """
+        import random
+
+        rng = random.Random(seed)
+        size = len(self)
+        if max_tries is None:
+            max_tries = 100 * k + 1000
+        seen = set()
+        picked = {}
+        tries = 0
+        while len(picked) < k and len(seen) < size and tries < max_tries:
+            tries += 1
+            index = rng.randrange(size)
+            if index in seen:
+                continue
+            seen.add(index)
+            pw = self.unrank(index)
+            if pw is not None:
+                picked.setdefault(pw, None)
+        return list(picked)
+
+    def iter_parallel(self, workers, shard_size=100000):
+        """Yield the candidates of ``iter_range`` computed on worker processes.
+
+        Word and special pools are packed into shared memory once and
+        attached by every worker, so they are never pickled per worker.
+        The group rules are sent as they are. Shards come back in keyspace
+        order.
+        """
+        shared = []
+        pools = {}
+        try:
+            for key, values in (('words', self.words),
+                                ('specials', self.specials),
+                                ('numbers', self.numbers)):
+                if is_lazy(values):
+                    pools[key] = values
+                    continue
+                packed = values if isinstance(values, PackedPool) else \
+                    PackedPool(values)
+                shm, name = packed.share()
+                shared.append(shm)
+                pools[key] = name
+            spec = {
+                'patterns': self.patterns, 'pools': pools,
+                'min_length': self.min_length, 'max_length': self.max_length,
+                'word_groups': self.word_groups,
+                'number_groups': self.number_groups,
+                'special_groups': self.special_groups,
+                'policy': self.policy,
+                'charsets': {k: v.replace('?', '??')
+                             for k, v in self.charsets.items()},
+            }
+            size = len(self)
+            shards = ((start, min(start + shard_size, size))
+                      for start in range(0, size, shard_size))
+            for batch in ordered_map(_generate_shard, shards, workers,
+                                     _init_shard_worker, (spec,)):
+                yield from batch
+        finally:
+            _close_shard_worker()
+            for shm in shared:
+                shm.close()
+                shm.unlink()
+
+
+_shard_weaver = None
+
+
+def _init_shard_worker(spec):
+    global _shard_weaver
+    pools = {key: PackedPool.attach(source) if isinstance(source, str)
+             else source for key, source in spec['pools'].items()}
+    _shard_weaver = Weaver(spec['patterns'], min_length=spec['min_length'],
+                           max_length=spec['max_length'],
+                           word_groups=spec['word_groups'],
+                           number_groups=spec['number_groups'],
+                           special_groups=spec['special_groups'],
+                           policy=spec['policy'], charsets=spec['charsets'],
+                           **pools)
+
+
+def _close_shard_worker():
+    # Only set in this process when ordered_map ran the shards inline
+    global _shard_weaver
+    if _shard_weaver is not None:
+        for pool in (_shard_weaver.words, _shard_weaver.numbers,
+                     _shard_weaver.specials):
+            if isinstance(pool, PackedPool):
+                pool.close()
+        _shard_weaver = None
+
+
+def _generate_shard(bounds):
+    return list(_shard_weaver.iter_range(*bounds))
 
 
 def parse_word_groups(value):
@@ -163,10 +1435,1199 @@ def parse_special_groups(value):
     return specials, groups
 
 
-def main():
+def compile_patterns(value, pattern_mode='as-is'):
+    patterns = []
+    for p in value.split(';'):
+        p = p.strip()
+        out = []
+        mask = ''
+        for m in re.finditer(r'\?.\d*|.', p):
+            ch, i = m.group(), m.start()
+            if ch.startswith('?') and len(ch) > 1:
+                mask += ch
+                continue
+            if mask:
+                out.append(f'{{mask:{mask}}}')
+                mask = ''
+            if ch.lower() == 'w':
+                if pattern_mode == 'any':
+                    out.append(f'{{word{i}*}}')
+                elif pattern_mode == 'cap':
+                    out.append(f'{{word{i}}}')
+                else:
+                    out.append(f'{{word{i}}}')
+            elif ch.lower() == 'n':
+                out.append('{number}')
+            elif ch.lower() == 's':
+                out.append('{special}')
+            else:
+                logging.warning(f'Unsupported pattern character: {ch}')
+        if mask:
+            out.append(f'{{mask:{mask}}}')
+        patterns.append(''.join(out))
+    return patterns
+
+
+def load_words(value):
+    if not value:
+        return [], []
+    if value.startswith('@'):
+        return load_grouped_file(value[1:])
+    return parse_word_groups(value)
+
+
+def load_numbers(value):
+    if not value:
+        return [], []
+    if value.startswith('@'):
+        return load_grouped_file(value[1:])
+    return parse_number_groups(value)
+
+
+def load_specials(value):
+    if not value:
+        return [], []
+    if value.startswith('@'):
+        return load_grouped_file(value[1:])
+    if ';' in value:
+        return parse_special_groups(value)
+    return list(value), []
+
+
+INDEX_MAGIC = b'WVRIDX01'
+INDEX_HEADER = struct.Struct('<8sQQ4s')
+SEPARATORS = {'lines': '\n', 'nul': '\0'}
+
+
+class BackgroundWriter:
+    """Double-buffered file writer that does the disk I/O on its own thread.
+
+    ``write()`` collects byte chunks until ``buffer_size`` is reached and then
+    hands the whole buffer to the writer thread through a one-slot queue, so
+    the producer fills the next buffer while the previous one is written.
+    """
+
+    def __init__(self, f, buffer_size=1 << 20, use_writev=False):
+        import queue
+        import threading
+        self._file = f
+        self.buffer_size = buffer_size
+        self.use_writev = use_writev and hasattr(os, 'writev')
+        self._parts = []
+        self._pending = 0
+        self._error = None
+        self._queue = queue.Queue(maxsize=1)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, data):
+        self._parts.append(data)
+        self._pending += len(data)
+        if self._pending >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._error is not None:
+            raise self._error
+        if not self._parts:
+            return
+        chunk = self._parts if self.use_writev else b''.join(self._parts)
+        self._parts = []
+        self._pending = 0
+        self._queue.put(chunk)
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._queue.put(None)
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def _run(self):
+        while True:
+            chunk = self._queue.get()
+            if chunk is None:
+                return
+            if self._error is not None:
+                continue
+            try:
+                if self.use_writev:
+                    self._writev(chunk)
+                else:
+                    self._file.write(chunk)
+            except BaseException as e:
+                self._error = e
+
+    def _writev(self, parts):
+        self._file.flush()
+        fd = self._file.fileno()
+        iov_max = os.sysconf('SC_IOV_MAX') if hasattr(
+            os, 'sysconf') else 1024
+        if iov_max <= 0:
+            # -1 means no fixed limit
+            iov_max = 1024
+        for start in range(0, len(parts), iov_max):
+            group = parts[start:start + iov_max]
+            written = os.writev(fd, group)
+            total = sum(len(p) for p in group)
+            if written < total:
+                rest = memoryview(b''.join(group))[written:]
+                while rest:
+                    rest = rest[os.write(fd, rest):]
+
+
+class WordlistWriter:
+    """Buffered wordlist output file with an optional offset index."""
+
+    def __init__(self, path, index_every=0, separator='\n',
+                 buffer_size=1 << 20, use_writev=False):
+        self.path = path
+        self.index_every = index_every
+        self.separator = separator
+        self.count = 0
+        self.size = 0
+        self.offsets = array('Q')
+        self._file = open(path, 'wb')
+        self._out = BackgroundWriter(self._file, buffer_size, use_writev)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write_batch(self, batch):
+        if not batch:
+            return
+        if self.index_every:
+            sep = self.separator.encode('utf-8')
+            encoded = [pw.encode('utf-8') + sep for pw in batch]
+            starts = list(itertools.accumulate(map(len, encoded), initial=0))
+            for i in range(-self.count % self.index_every, len(batch),
+                           self.index_every):
+                self.offsets.append(self.size + starts[i])
+            data = b''.join(encoded)
+        else:
+            data = (self.separator.join(batch) +
+                    self.separator).encode('utf-8')
+        self._out.write(data)
+        self.size += len(data)
+        self.count += len(batch)
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            self._out.close()
+        finally:
+            self._file.close()
+        if self.index_every:
+            write_index(self.path + '.idx', self.offsets, self.index_every,
+                        self.count, self.separator.encode('utf-8'))
+
+
+def write_wordlist(path, passwords, index_every=0, separator='\n',
+                   buffer_size=1 << 20, use_writev=False, batch_size=8192):
+    with WordlistWriter(path, index_every, separator, buffer_size,
+                        use_writev) as out:
+        for batch in iter_batches(passwords, batch_size):
+            out.write_batch(batch)
+    return out.count
+
+
+def partition_path(path, label):
+    root, ext = os.path.splitext(path)
+    return f'{root}.{label}{ext}'
+
+
+def write_partitioned(path, records, split_lines=None, split_files=None,
+                      by_length=False, total=None, batch_size=8192,
+                      **writer_options):
+    for size in (split_lines, split_files):
+        if size is not None and size <= 0:
+            raise ValueError(f"Split size must be positive, got {size}")
+    if split_files:
+        if total is None:
+            total = len(records)
+        split_lines = max(1, -(-total // split_files))
+
+    parts = []
+    if split_lines:
+        current = None
+        for batch in iter_batches(records, batch_size):
+            while batch:
+                if current is None or current.count == split_lines:
+                    if current is not None:
+                        current.close()
+                    current = WordlistWriter(
+                        partition_path(path, f'{len(parts):03d}'),
+                        **writer_options)
+                    parts.append((current, None))
+                room = split_lines - current.count
+                current.write_batch(batch[:room])
+                batch = batch[room:]
+    elif by_length:
+        writers = {}
+        for batch in iter_batches(records, batch_size):
+            buckets = {}
+            for pw in batch:
+                buckets.setdefault(len(pw), []).append(pw)
+            for length, items in buckets.items():
+                if length not in writers:
+                    writers[length] = WordlistWriter(
+                        partition_path(path, f'len{length:02d}'),
+                        **writer_options)
+                writers[length].write_batch(items)
+        parts = [(writers[n], n) for n in sorted(writers)]
+    else:
+        raise ValueError('No partitioning mode given')
+
+    for writer, _ in parts:
+        writer.close()
+
+    files = []
+    for writer, length in parts:
+        entry = {'path': os.path.basename(writer.path),
+                 'lines': writer.count, 'bytes': writer.size}
+        if length is not None:
+            entry['length'] = length
+        files.append(entry)
+    manifest = {'files': files,
+                'lines': sum(f['lines'] for f in files),
+                'bytes': sum(f['bytes'] for f in files)}
+
+    import json
+    with open(manifest_path(path), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def manifest_path(path):
+    return os.path.splitext(path)[0] + '.manifest.json'
+
+
+def write_index(path, offsets, every, count, separator=b'\n'):
+    if sys.byteorder == 'big':
+        offsets = array('Q', offsets)
+        offsets.byteswap()
+    with open(path, 'wb') as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, every, count,
+                                  separator.ljust(4, b'\0')))
+        offsets.tofile(f)
+
+
+def read_index(path):
+    with open(path, 'rb') as f:
+        header = f.read(INDEX_HEADER.size)
+        if len(header) != INDEX_HEADER.size:
+            raise ValueError(f"Truncated index file: {path}")
+        magic, every, count, sep = INDEX_HEADER.unpack(header)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"Not a weaver index file: {path}")
+        offsets = array('Q')
+        offsets.frombytes(f.read())
+    if sys.byteorder == 'big':
+        offsets.byteswap()
+    separator = sep.rstrip(b'\0') or b'\0'
+    if len(offsets) != (count + every - 1) // every:
+        raise ValueError(f"Index does not match its header: {path}")
+    return offsets, every, count, separator
+
+
+def build_index(path, every=1024, separator=b'\n'):
+    offsets = array('Q')
+    pos = 0
+    count = 0
+    with open(path, 'rb') as f:
+        for record in _read_records(f, separator):
+            if count % every == 0:
+                offsets.append(pos)
+            pos += len(record) + len(separator)
+            count += 1
+    return offsets, every, count, separator
+
+
+def _read_records(f, separator, chunk_size=1 << 16):
+    tail = b''
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        parts = (tail + chunk).split(separator)
+        tail = parts.pop()
+        yield from parts
+    if tail:
+        yield tail
+
+
+class WordlistReader:
+    """Random access to a wordlist by candidate number via its offset index."""
+
+    def __init__(self, path, index_path=None, separator=None):
+        self.path = path
+        index_path = index_path or path + '.idx'
+        if os.path.exists(index_path):
+            self.offsets, self.every, self.count, sep = read_index(index_path)
+        else:
+            sep = (separator or '\n').encode('utf-8')
+            self.offsets, self.every, self.count, sep = build_index(
+                path, separator=sep)
+        self.separator = sep
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return self.iter_from(0)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.count)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return list(itertools.islice(self.iter_from(start), stop - start))
+        if key < 0:
+            key += self.count
+        if not 0 <= key < self.count:
+            raise IndexError('candidate index out of range')
+        return next(self.iter_from(key))
+
+    def iter_from(self, start):
+        if start >= self.count:
+            return
+        block, skip = divmod(start, self.every)
+        with open(self.path, 'rb') as f:
+            f.seek(self.offsets[block])
+            records = _read_records(f, self.separator)
+            for _ in itertools.islice(records, skip):
+                pass
+            for record in itertools.islice(records, self.count - start):
+                yield record.decode('utf-8')
+
+
+def iter_chunks(f, chunk_size=1 << 22, separator=b'\n'):
+    tail = b''
+    while True:
+        block = f.read(chunk_size)
+        if not block:
+            break
+        block = tail + block
+        cut = block.rfind(separator) + 1
+        if not cut:
+            tail = block
+            continue
+        tail = block[cut:]
+        yield block[:cut]
+    if tail:
+        yield tail + separator
+
+
+def ordered_map(func, items, workers=1, initializer=None, initargs=(), depth=None):
+    items = iter(items)
+    head = list(itertools.islice(items, 2))
+    items = itertools.chain(head, items)
+    if workers <= 1 or len(head) < 2:
+        if initializer is not None:
+            initializer(*initargs)
+        yield from map(func, items)
+        return
+
+    import multiprocessing
+    from collections import deque
+    depth = depth or workers * 2
+    with multiprocessing.Pool(workers, initializer, initargs) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.apply_async(func, (item,)))
+            if len(pending) >= depth:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+_chunk_filter = None
+
+
+def _init_chunk_filter(separator, *rules):
+    global _chunk_filter
+    keep = make_filter(*rules)
+    sep = separator.decode('utf-8')
+
+    def run(chunk):
+        lines = chunk.decode('utf-8', 'surrogateescape').split(sep)
+        if sep == '\n':
+            lines = [line.rstrip('\r') for line in lines]
+        lines = [pw for pw in lines if pw]
+        kept = [pw for pw in lines if keep(pw)]
+        out = ''.join(pw + sep for pw in kept)
+        return out.encode('utf-8', 'surrogateescape'), len(lines), len(kept)
+    _chunk_filter = run
+
+
+def _filter_chunk(chunk):
+    return _chunk_filter(chunk)
+
+
+def filter_stream(src, dst, min_len, max_len, word_groups=(), number_groups=(),
+                  special_groups=(), workers=1, chunk_size=1 << 22,
+                  separator=b'\n'):
+    seen = kept = 0
+    rules = (separator, min_len, max_len, word_groups, number_groups,
+             special_groups)
+    for data, n_in, n_out in ordered_map(_filter_chunk, iter_chunks(src, chunk_size, separator),
+                                         workers, _init_chunk_filter, rules):
+        dst.write(data)
+        seen += n_in
+        kept += n_out
+    return seen, kept
+
+
+def _md4(data):
+    def rol(x, n):
+        x &= 0xffffffff
+        return (x << n | x >> (32 - n)) & 0xffffffff
+
+    msg = bytearray(data)
+    bit_len = len(msg) * 8
+    msg.append(0x80)
+    msg.extend(b'\0' * ((56 - len(msg) % 64) % 64))
+    msg.extend(struct.pack('<Q', bit_len & 0xffffffffffffffff))
+
+    h = [0x67452301, 0xefcdab89, 0x98badcfe, 0x10325476]
+    for off in range(0, len(msg), 64):
+        x = struct.unpack('<16I', msg[off:off + 64])
+        a, b, c, d = h
+        for i in (0, 4, 8, 12):
+            a = rol(a + ((b & c) | (~b & d)) + x[i], 3)
+            d = rol(d + ((a & b) | (~a & c)) + x[i + 1], 7)
+            c = rol(c + ((d & a) | (~d & b)) + x[i + 2], 11)
+            b = rol(b + ((c & d) | (~c & a)) + x[i + 3], 19)
+        for i in (0, 1, 2, 3):
+            a = rol(a + ((b & c) | (b & d) | (c & d)) + x[i] + 0x5a827999, 3)
+            d = rol(d + ((a & b) | (a & c) | (b & c)) + x[i + 4] + 0x5a827999, 5)
+            c = rol(c + ((d & a) | (d & b) | (a & b)) + x[i + 8] + 0x5a827999, 9)
+            b = rol(b + ((c & d) | (c & a) | (d & a)) + x[i + 12] + 0x5a827999, 13)
+        for i in (0, 2, 1, 3):
+            a = rol(a + (b ^ c ^ d) + x[i] + 0x6ed9eba1, 3)
+            d = rol(d + (a ^ b ^ c) + x[i + 8] + 0x6ed9eba1, 9)
+            c = rol(c + (d ^ a ^ b) + x[i + 4] + 0x6ed9eba1, 11)
+            b = rol(b + (c ^ d ^ a) + x[i + 12] + 0x6ed9eba1, 15)
+        h = [(v + n) & 0xffffffff for v, n in zip(h, (a, b, c, d))]
+    return struct.pack('<4I', *h).hex()
+
+
+HASH_ALGORITHMS = {'md5': 32, 'sha1': 40, 'sha256': 64, 'ntlm': 32}
+
+
+def make_hasher(algorithm):
+    import hashlib
+    if algorithm not in HASH_ALGORITHMS:
+        raise ValueError(f"Unsupported hash algorithm: {algorithm}")
+    if algorithm == 'ntlm':
+        try:
+            hashlib.new('md4')
+        except ValueError:
+            return lambda pw: _md4(pw.encode('utf-16-le'))
+        return lambda pw: hashlib.new('md4', pw.encode('utf-16-le')).hexdigest()
+    constructor = getattr(hashlib, algorithm)
+    return lambda pw: constructor(pw.encode('utf-8')).hexdigest()
+
+
+def load_hashes(path, algorithm):
+    size = HASH_ALGORITHMS[algorithm]
+    hashes = set()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            for field in line.strip().split(':'):
+                field = field.strip().lower()
+                if len(field) == size and re.fullmatch(r'[0-9a-f]+', field):
+                    hashes.add(field)
+    return hashes
+
+
+def iter_batches(items, size):
+    it = iter(items)
+    while True:
+        batch = list(itertools.islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+_batch_hasher = None
+
+
+def _init_batch_hasher(algorithm, targets=None, hash_only=False):
+    global _batch_hasher
+    digest = make_hasher(algorithm)
+
+    def run(batch):
+        out = []
+        for pw in batch:
+            h = digest(pw)
+            if targets is not None and h not in targets:
+                continue
+            out.append(h if hash_only else f'{h}:{pw}')
+        return out
+    _batch_hasher = run
+
+
+def _hash_batch(batch):
+    return _batch_hasher(batch)
+
+
+def hash_passwords(passwords, algorithm, targets=None, hash_only=False,
+                   workers=1, batch_size=10000):
+    for out in ordered_map(_hash_batch, iter_batches(passwords, batch_size),
+                           workers, _init_batch_hasher,
+                           (algorithm, targets, hash_only)):
+        yield from out
+
+
+class CandidateServer:
+    """Hand out numbered keyspace batches to cracker clients over a socket.
+
+    Batch ``k`` holds the candidates of keyspace indices
+    ``[k * batch_size, (k + 1) * batch_size)``. A batch stays leased until a
+    client acknowledges it; batches held by a client that disconnects, or
+    for longer than ``lease_timeout`` seconds, are handed out again.
+
+    The protocol is line based: ``GET`` is answered with
+    ``BATCH <id> <count>`` followed by ``count`` candidate lines, with
+    ``WAIT`` while the remaining batches are all leased, or with ``DONE``;
+    ``ACK <id>`` is answered with ``OK``.
+    """
+
+    def __init__(self, generator, batch_size=100000, lease_timeout=None):
+        from collections import deque
+        self.generator = generator
+        self.batch_size = batch_size
+        self.lease_timeout = lease_timeout
+        self.size = len(generator)
+        self.total = -(-self.size // batch_size)
+        self.acked = set()
+        self.address = None
+        self._next = 0
+        self._reissue = deque()
+        self._leases = {}
+        self._done = None
+        self._handlers = set()
+
+    @property
+    def finished(self):
+        return len(self.acked) == self.total
+
+    def lease(self, client):
+        import time
+        now = time.monotonic()
+        if self.lease_timeout is not None:
+            for bid, (_, since) in list(self._leases.items()):
+                if now - since > self.lease_timeout:
+                    del self._leases[bid]
+                    self._reissue.append(bid)
+        while self._reissue:
+            bid = self._reissue.popleft()
+            if bid not in self.acked:
+                break
+        else:
+            if self._next >= self.total:
+                return None
+            bid = self._next
+            self._next += 1
+        self._leases[bid] = (client, now)
+        return bid
+
+    def ack(self, bid):
+        if not 0 <= bid < self._next:
+            return False
+        self._leases.pop(bid, None)
+        self.acked.add(bid)
+        if self.finished and self._done is not None:
+            self._done.set()
+        return True
+
+    def release(self, client):
+        for bid, (holder, _) in list(self._leases.items()):
+            if holder is client:
+                del self._leases[bid]
+                self._reissue.append(bid)
+
+    def batch(self, bid):
+        start = bid * self.batch_size
+        return list(self.generator.iter_range(
+            start, min(start + self.batch_size, self.size)))
+
+    async def handle(self, reader, writer):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        client = object()
+        self._handlers.add(asyncio.current_task())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                cmd, *params = line.decode('utf-8').split() or ['']
+                if cmd == 'GET':
+                    bid = self.lease(client)
+                    if bid is None:
+                        writer.write(b'DONE\n' if self.finished else b'WAIT\n')
+                    else:
+                        candidates = await loop.run_in_executor(
+                            None, self.batch, bid)
+                        writer.write(f'BATCH {bid} {len(candidates)}\n'.encode())
+                        writer.write(''.join(pw + '\n' for pw in candidates)
+                                     .encode('utf-8'))
+                elif cmd == 'ACK' and len(params) == 1 and params[0].isdigit():
+                    writer.write(b'OK\n' if self.ack(int(params[0]))
+                                 else b'ERR unknown batch\n')
+                else:
+                    writer.write(b'ERR unknown command\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._handlers.discard(asyncio.current_task())
+            self.release(client)
+            writer.close()
+
+    async def serve(self, path=None, host='127.0.0.1', port=0, ready=None,
+                    grace=1.0):
+        import asyncio
+        self._done = asyncio.Event()
+        if self.finished:
+            self._done.set()
+        if path:
+            server = await asyncio.start_unix_server(self.handle, path)
+            self.address = path
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            self.address = server.sockets[0].getsockname()[:2]
+        if ready is not None:
+            ready(self.address)
+        async with server:
+            await self._done.wait()
+            # Let connected clients read DONE instead of a reset connection
+            if self._handlers:
+                await asyncio.wait(set(self._handlers), timeout=grace)
+
+
+def fetch_candidates(address, poll_interval=1.0):
+    import socket
+    import time
+    if isinstance(address, str):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(address)
+    else:
+        sock = socket.create_connection(tuple(address))
+    with sock, sock.makefile('rwb') as f:
+        while True:
+            f.write(b'GET\n')
+            f.flush()
+            reply = f.readline().split()
+            if not reply or reply[0] == b'DONE':
+                return
+            if reply[0] == b'WAIT':
+                time.sleep(poll_interval)
+                continue
+            bid, count = int(reply[1]), int(reply[2])
+            for _ in range(count):
+                yield f.readline()[:-1].decode('utf-8')
+            f.write(b'ACK %d\n' % bid)
+            f.flush()
+            f.readline()
+
+
+class SpilledSet:
+    """Deduplicated, sorted candidates kept as sorted runs on disk.
+
+    Candidates are collected into sets of ``run_size``; each full set is
+    sorted and written to a temporary run file. Iterating merges the runs
+    and skips repeats, so memory use is bounded by one run.
+    """
+
+    def __init__(self, candidates, run_size=1000000, directory=None):
+        import tempfile
+        self._dir = tempfile.TemporaryDirectory(prefix='weaver-',
+                                                dir=directory)
+        self.runs = []
+        self._count = None
+        batch = set()
+        for pw in candidates:
+            batch.add(pw)
+            if len(batch) >= run_size:
+                self._spill(batch)
+                batch = set()
+        if batch:
+            self._spill(batch)
+
+    def _spill(self, batch):
+        path = os.path.join(self._dir.name, f'run{len(self.runs):05d}')
+        with open(path, 'w', encoding='utf-8', newline='\n') as f:
+            f.writelines(pw + '\n' for pw in sorted(batch))
+        self.runs.append(path)
+
+    def __iter__(self):
+        import heapq
+        files = [open(path, 'r', encoding='utf-8', newline='\n')
+                 for path in self.runs]
+        try:
+            last = None
+            count = 0
+            for pw in heapq.merge(*((line[:-1] for line in f)
+                                    for f in files)):
+                if pw != last:
+                    last = pw
+                    count += 1
+                    yield pw
+            self._count = count
+        finally:
+            for f in files:
+                f.close()
+
+    def __len__(self):
+        if self._count is None:
+            self._count = sum(1 for _ in self)
+        return self._count
+
+    def close(self):
+        self._dir.cleanup()
+
+
+# Rough CPython cost of one candidate held in a set and a sorted list:
+# the str object header plus set and list slots
+CANDIDATE_OVERHEAD = 49 + 48
+PARALLEL_THRESHOLD = 5000000
+
+
+def available_memory():
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def average_length(generator):
+    total = weighted = 0
+    for (pat, tokens, pools, _, _), (size, _, _) in zip(generator._compiled,
+                                                        generator._layouts):
+        length = len(''.join(pattern_segments(pat, tokens)))
+        for pool in pools:
+            if hasattr(pool, 'length_histogram'):
+                histogram = pool.length_histogram()
+                length += sum(n * c for n, c in histogram.items()) / len(pool)
+            else:
+                length += sum(map(len, pool)) / len(pool)
+        total += size
+        weighted += size * length
+    return weighted / total if total else 0.0
+
+
+def plan_generation(generator, workers=1, memory_limit=None,
+                    enumeration='auto', dedup='auto', sort=True):
+    """Choose how to enumerate, deduplicate and sort a generator's output.
+
+    The keyspace size is an upper bound on the candidate count, so the
+    memory estimate errs on the high side. ``'auto'`` choices are made from
+    the estimate, the memory budget (half the available RAM unless
+    ``memory_limit`` is given) and the worker count; anything else is kept
+    as an override.
+    """
+    keyspace = len(generator)
+    avg = average_length(generator)
+    per_candidate = CANDIDATE_OVERHEAD + avg
+    estimate = int(keyspace * per_candidate)
+    available = available_memory()
+    budget = memory_limit or (available // 2 if available else 1 << 30)
+
+    if enumeration == 'auto':
+        enumeration = 'parallel' if workers > 1 and \
+            keyspace >= PARALLEL_THRESHOLD else 'trie'
+    if dedup == 'auto':
+        dedup = 'memory' if estimate <= budget else 'spill'
+    return {
+        'patterns': len(generator.patterns),
+        'compiled': len(generator._compiled),
+        'keyspace': keyspace,
+        'average_length': avg,
+        'memory_estimate': estimate,
+        'memory_available': available,
+        'memory_budget': budget,
+        'enumeration': enumeration,
+        'workers': workers if enumeration == 'parallel' else 1,
+        'dedup': dedup,
+        'sort': sort or dedup == 'spill',
+        'run_size': max(100000, int(budget // per_candidate)),
+    }
+
+
+def execute_plan(generator, plan, spill_dir=None, phase=None):
+    phase = phase or (lambda name: contextlib.nullcontext())
+    if plan['enumeration'] == 'parallel':
+        candidates = generator.iter_parallel(plan['workers'])
+    else:
+        candidates = iter(generator)
+    if plan['dedup'] == 'spill':
+        with phase('generate'):
+            return SpilledSet(candidates, plan['run_size'], spill_dir)
+    if plan['dedup'] == 'memory':
+        with phase('generate'):
+            candidates = dict.fromkeys(candidates)
+    elif plan['sort']:
+        with phase('generate'):
+            candidates = list(candidates)
+    if not plan['sort']:
+        return candidates
+    with phase('sort'):
+        return sorted(candidates)
+
+
+class Sink:
+    """One filtered output of a fan-out run.
+
+    A candidate reaches the sink when it fits the sink's length bounds and
+    policy and, given the slot values it was built from, does not combine
+    two members of one of the sink's groups.
+    """
+
+    def __init__(self, output, min_length=1, max_length=100, word_groups=(),
+                 number_groups=(), special_groups=(), policy=None):
+        self.output = output
+        self.min_length = min_length
+        self.max_length = max_length
+        self.classes = 0
+        if policy:
+            if policy.get('min_length') is not None:
+                self.min_length = max(self.min_length, policy['min_length'])
+            if policy.get('max_length') is not None:
+                self.max_length = min(self.max_length, policy['max_length'])
+            self.classes = policy['classes']
+        self.indexes = {'word': index_groups(word_groups, fold_case=True),
+                        'number': index_groups(number_groups),
+                        'special': index_groups(special_groups)}
+        self.has_groups = any(self.indexes.values())
+
+    @property
+    def has_checks(self):
+        return bool(self.classes) or self.has_groups
+
+    def check(self, pw, values=None):
+        """Apply the policy and group rules; the length is checked by the caller."""
+        if self.classes and char_classes(pw) & self.classes != self.classes:
+            return False
+        if self.has_groups and values:
+            seen = {}
+            for kind, value in values:
+                index = self.indexes.get(kind)
+                if not index:
+                    continue
+                member = value.lower() if kind == 'word' else value
+                for gid in index.get(member, ()):
+                    if seen.setdefault((kind, gid), member) != member:
+                        return False
+        return True
+
+
+def parse_sink_groups(value, parse):
+    if isinstance(value, str):
+        return parse(value)[1]
+    return [list(group) for group in value or ()]
+
+
+def load_sinks(path, min_length=1, max_length=100):
+    """Read sink definitions from a JSON file.
+
+    The file holds a list of objects, or ``{"sinks": [...]}``, with an
+    ``output`` path and optional ``min_length``, ``max_length``, ``policy``,
+    ``word_groups``, ``number_groups`` and ``special_groups`` written as on
+    the command line or as lists of lists. Bounds default to the arguments.
+    """
+    config = load_config(path)
+    if isinstance(config, dict):
+        config = config.get('sinks', [])
+    sinks = []
+    for entry in config:
+        if not entry.get('output'):
+            raise ValueError(f"Sink without an output file in {path}")
+        policy = entry.get('policy')
+        sinks.append(Sink(
+            entry['output'],
+            min_length=entry.get('min_length', min_length),
+            max_length=entry.get('max_length', max_length),
+            word_groups=parse_sink_groups(entry.get('word_groups'),
+                                          parse_word_groups),
+            number_groups=parse_sink_groups(entry.get('number_groups'),
+                                            parse_number_groups),
+            special_groups=parse_sink_groups(entry.get('special_groups'),
+                                             parse_special_groups),
+            policy=parse_policy(policy) if policy else None))
+    if not sinks:
+        raise ValueError(f"No sinks defined in {path}")
+    return sinks
+
+
+def fan_out(generator, sinks, dedup=True, sort=True, workers=1, phase=None,
+            batch_size=8192, **writer_options):
+    """Generate once and write every sink's share of the candidates.
+
+    Candidates are routed by length to the sinks whose bounds they fit, and
+    only those sinks run their policy and group checks. Slot values are
+    tracked only when some sink has group rules; otherwise ``workers > 1``
+    generates in keyspace shards. With ``dedup`` or ``sort`` each sink
+    collects its candidates in memory before writing, otherwise they are
+    streamed. Returns the number of candidates written per sink.
+    """
+    phase = phase or (lambda name: contextlib.nullcontext())
+    if any(sink.has_groups for sink in sinks):
+        candidates = generator.iter_provenance()
+    else:
+        pws = generator.iter_parallel(workers) if workers > 1 \
+            else iter(generator)
+        candidates = zip(pws, itertools.repeat(None))
+
+    def route(targets):
+        routes = {}
+        for sink, target in zip(sinks, targets):
+            check = sink.check if sink.has_checks else None
+            for n in range(sink.min_length, sink.max_length + 1):
+                routes.setdefault(n, []).append((check, target))
+        return routes
+
+    if dedup or sort:
+        kept = [{} if dedup else [] for _ in sinks]
+        routes = route([k.setdefault if dedup else k.append for k in kept])
+        with phase('generate'):
+            for pw, values in candidates:
+                for check, keep in routes.get(len(pw), ()):
+                    if check is None or check(pw, values):
+                        keep(pw)
+        if sort:
+            with phase('sort'):
+                kept = [sorted(k) for k in kept]
+        with phase('write'):
+            return [write_wordlist(sink.output, k, batch_size=batch_size,
+                                   **writer_options)
+                    for sink, k in zip(sinks, kept)]
+
+    with contextlib.ExitStack() as stack:
+        writers = [stack.enter_context(WordlistWriter(sink.output,
+                                                      **writer_options))
+                   for sink in sinks]
+        outputs = [([], out) for out in writers]
+        routes = route(outputs)
+        # Streamed sinks generate while writing, so that time lands here
+        with phase('write'):
+            for pw, values in candidates:
+                for check, (batch, out) in routes.get(len(pw), ()):
+                    if check is None or check(pw, values):
+                        batch.append(pw)
+                        if len(batch) >= batch_size:
+                            out.write_batch(batch)
+                            batch.clear()
+            for batch, out in outputs:
+                out.write_batch(batch)
+    return [out.count for out in writers]
+
+
+class PhaseProfiler:
+    """Profile named pipeline phases into one set of files per phase.
+
+    Every phase is sampled every ``interval`` seconds from a background
+    thread and written to ``<name>.collapsed``, one ``frame;frame;... count``
+    line per stack as read by flamegraph.pl or speedscope. With
+    ``mode='cprofile'`` the phase also runs under cProfile and
+    ``<name>.pstats`` is written next to it.
+    """
+
+    def __init__(self, directory, mode='cprofile', interval=0.005):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.mode = mode
+        self.interval = interval
+        self.timings = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        import threading
+        import time
+
+        counts = {}
+        target = threading.get_ident()
+        stop = threading.Event()
+
+        def sample():
+            while not stop.wait(self.interval):
+                frame = sys._current_frames().get(target)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} "
+                                 f"({os.path.basename(code.co_filename)}"
+                                 f":{code.co_firstlineno})")
+                    frame = frame.f_back
+                if stack:
+                    key = ';'.join(reversed(stack))
+                    counts[key] = counts.get(key, 0) + 1
+
+        profile = None
+        if self.mode == 'cprofile':
+            import cProfile
+            profile = cProfile.Profile()
+        sampler = threading.Thread(target=sample, daemon=True)
+        start = time.perf_counter()
+        sampler.start()
+        if profile:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile:
+                profile.disable()
+            stop.set()
+            sampler.join()
+            self.timings[name] = time.perf_counter() - start
+            base = os.path.join(self.directory, name)
+            if profile:
+                profile.dump_stats(base + '.pstats')
+            with open(base + '.collapsed', 'w', encoding='utf-8') as f:
+                for stack, n in sorted(counts.items()):
+                    f.write(f"{stack} {n}\n")
+            logging.info(
+                f"Profiled phase {name}: {self.timings[name]:.3f}s, {sum(counts.values())} samples")
+
+
+def format_size(n):
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if n < 1024 or unit == 'GiB':
+            return f"{n:.1f} {unit}" if unit != 'B' else f"{n} B"
+        n /= 1024
+
+
+def format_plan(plan):
+    available = format_size(plan['memory_available']) \
+        if plan['memory_available'] else 'unknown'
+    enumeration = {'trie': 'shared-prefix trie, single process',
+                   'parallel': f"keyspace shards on {plan['workers']} workers"}
+    dedup = {'memory': 'in-memory set',
+             'spill': f"sorted runs of {plan['run_size']:,} spilled to disk",
+             'none': 'off'}
+    if plan['dedup'] == 'spill':
+        sort = 'merge of sorted runs'
+    else:
+        sort = 'in memory' if plan['sort'] else 'off (generation order)'
+    return '\n'.join([
+        'Plan:',
+        f"  patterns      {plan['compiled']} of {plan['patterns']} after pruning",
+        f"  keyspace      {plan['keyspace']:,} candidates (upper bound)",
+        f"  avg length    {plan['average_length']:.1f}",
+        f"  memory        ~{format_size(plan['memory_estimate'])} to hold every "
+        f"candidate; budget {format_size(plan['memory_budget'])}, "
+        f"available {available}",
+        f"  enumeration   {enumeration[plan['enumeration']]}",
+        f"  dedup         {dedup[plan['dedup']]}",
+        f"  sort          {sort}",
+    ])
+
+
+def serve_main(argv):
+    import argparse
+    import asyncio
 
     parser = argparse.ArgumentParser(
-        description='Weaver - Generate wordlist for password testing')
+        prog='weaver serve',
+        description='Serve batches of weaver candidates to local cracking workers')
+    add_generation_arguments(parser)
+    parser.add_argument('--socket', metavar='PATH',
+                        help='Listen on a Unix socket instead of TCP')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='TCP listen address (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=7070,
+                        help='TCP listen port (default: 7070)')
+    parser.add_argument('--batch-size', type=int, default=100000,
+                        help='Keyspace indices per batch (default: 100000)')
+    parser.add_argument('--lease-timeout', type=float, default=None, metavar='SECONDS',
+                        help='Reissue batches not acknowledged within this time')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+
+    if not args.patterns:
+        logging.error("No patterns provided")
+        return
+    server = CandidateServer(weaver_from_args(args, parser),
+                             max(args.batch_size, 1), args.lease_timeout)
+    log_pool_stats(server.generator)
+    asyncio.run(server.serve(
+        args.socket, args.host, args.port,
+        ready=lambda address: logging.info(
+            f"Serving {server.total} batches on {address}")))
+    logging.info(f"All {server.total} batches acknowledged")
+
+
+def filter_main(argv):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='weaver filter',
+        description='Apply weaver length and group rules to an existing wordlist')
+    parser.add_argument('input', nargs='?', default='-',
+                        help='Input wordlist (default: stdin)')
+    parser.add_argument('--output', default='-',
+                        help='Output file path (default: stdout)')
+    parser.add_argument(
+        '--words', help='Grouped by commas, separated by semicolon or @file')
+    parser.add_argument('--numbers', help='Semicolon-separated or @file')
+    parser.add_argument(
+        '--specials', help='String, semicolon-separated or @file')
+    parser.add_argument('--min-length', type=int, default=1,
+                        help='Minimum password length')
+    parser.add_argument('--max-length', type=int,
+                        default=100, help='Maximum password length')
+    parser.add_argument('--format', choices=sorted(SEPARATORS), default='lines',
+                        help='Record separator of input and output (default: lines)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Filter processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=4, metavar='MB',
+                        help='Input batch size in MiB (default: 4)')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Enable verbose logging')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+
+    _, word_groups = load_words(args.words)
+    _, number_groups = load_numbers(args.numbers)
+    _, special_groups = load_specials(args.specials)
+
+    src = sys.stdin.buffer if args.input == '-' else open(args.input, 'rb')
+    dst = sys.stdout.buffer if args.output == '-' else open(
+        args.output, 'wb')
+    try:
+        seen, kept = filter_stream(
+            src, dst, args.min_length, args.max_length, word_groups,
+            number_groups, special_groups, workers=args.workers,
+            chunk_size=max(args.chunk_size, 1) << 20,
+            separator=SEPARATORS[args.format].encode('utf-8'))
+    finally:
+        if src is not sys.stdin.buffer:
+            src.close()
+        if dst is not sys.stdout.buffer:
+            dst.close()
+        else:
+            dst.flush()
+
+    logging.info(f"Kept {kept} of {seen} candidates")
+
+
+def add_generation_arguments(parser):
     parser.add_argument(
         '--patterns', help='Pattern string using DSL like "WnS;WwS" (see --pattern-mode)')
     parser.add_argument(
@@ -174,8 +2635,6 @@ def main():
     parser.add_argument('--numbers', help='Semicolon-separated or @file')
     parser.add_argument(
         '--specials', help='String, semicolon-separated or @file')
-    parser.add_argument('--output', default='wordlist.txt',
-                        help='Output file path')
     parser.add_argument('--min-length', type=int, default=1,
                         help='Minimum password length')
     parser.add_argument('--max-length', type=int,
@@ -186,88 +2645,240 @@ def main():
                         help='Enable Unicode normalization (default: off)')
     parser.add_argument('--pattern-mode', choices=['as-is', 'cap', 'any'], default='as-is',
                         help='How to interpret pattern cases: as-is (default), cap (lower + capitalized), any (lower + uppercase + capitalized)')
-    args = parser.parse_args()
+    for n in range(1, 5):
+        parser.add_argument(f'--charset{n}', metavar='CHARS',
+                            help=f'Custom charset for ?{n} in masks (may use ?l, ?u, ?d, ?s)')
+    parser.add_argument('--policy',
+                        help='Password policy, e.g. "upper,digit,special,12-20" (classes: lower, upper, digit, special; length as N-M, min=N or max=N)')
+
+
+def weaver_from_args(args, parser):
+    patterns = compile_patterns(args.patterns, args.pattern_mode)
+    charsets = {str(n): getattr(args, f'charset{n}') for n in range(1, 5)
+                if getattr(args, f'charset{n}')}
+    try:
+        policy = parse_policy(args.policy) if args.policy else None
+        for pat in patterns:
+            parse_placeholders(pat, charsets)
+    except ValueError as e:
+        parser.error(str(e))
+
+    words, word_groups = load_words(args.words)
+    numbers, number_groups = load_numbers(args.numbers)
+    specials, special_groups = load_specials(args.specials)
+
+    if args.normalize:
+        words = list({generalize_string(w) for w in words})
+
+    try:
+        return Weaver(patterns, words, numbers, specials,
+                      min_length=args.min_length, max_length=args.max_length,
+                      word_groups=word_groups, number_groups=number_groups,
+                      special_groups=special_groups, policy=policy,
+                      charsets=charsets)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+def log_pool_stats(generator):
+    logging.info(
+        f"Used {len(generator.words)} words, {len(generator.numbers)} numbers, {len(generator.specials)} special chars")
+    all_groups = len(generator.word_groups) + \
+        len(generator.number_groups) + len(generator.special_groups)
+    logging.info(f"Applied {all_groups} conflict rules")
+
+
+def main(argv=None):
+    import argparse
+
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] == 'filter':
+        return filter_main(argv[1:])
+    if argv and argv[0] == 'serve':
+        return serve_main(argv[1:])
+
+    parser = argparse.ArgumentParser(
+        description='Weaver - Generate wordlist for password testing')
+    add_generation_arguments(parser)
+    parser.add_argument('--output', default='wordlist.txt',
+                        help='Output file path')
+    parser.add_argument('--hash', choices=sorted(HASH_ALGORITHMS),
+                        help='Write "hash:candidate" lines using this algorithm')
+    parser.add_argument('--hash-only', action='store_true',
+                        help='With --hash, write only the hashes')
+    parser.add_argument('--match', metavar='HASHFILE',
+                        help='With --hash, write only candidates whose hash appears in HASHFILE')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Worker processes for hashing (default: CPU count)')
+    parser.add_argument('--format', choices=sorted(SEPARATORS), default='lines',
+                        help='Output format: lines (newline-separated, default) or nul (NUL-separated)')
+    parser.add_argument('--index-every', type=int, default=0, metavar='M',
+                        help='Write OUTPUT.idx with the byte offset of every M-th candidate (default: off)')
+    parser.add_argument('--buffer-size', type=int, default=1024, metavar='KB',
+                        help='Output buffer handed to the writer thread, in KiB (default: 1024)')
+    parser.add_argument('--writev', action='store_true',
+                        help='Write buffers with os.writev instead of joining them first')
+    parser.add_argument('--sample', type=int, metavar='K',
+                        help='Write K candidates drawn uniformly at random from the keyspace instead of all of them')
+    parser.add_argument('--seed', type=int,
+                        help='Random seed for --sample (default: random)')
+    parser.add_argument('--explain', action='store_true',
+                        help='Print the generation plan and exit without generating')
+    parser.add_argument('--enumeration', choices=['auto', 'trie', 'parallel'],
+                        default='auto',
+                        help='Enumerate in one process or in keyspace shards on --workers processes (default: auto)')
+    parser.add_argument('--dedup', choices=['auto', 'memory', 'spill', 'none'],
+                        default='auto',
+                        help='Deduplicate in memory, via sorted runs on disk, or not at all (default: auto)')
+    parser.add_argument('--no-sort', action='store_true',
+                        help='Keep generation order instead of sorting the output')
+    parser.add_argument('--memory-limit', type=int, metavar='MB',
+                        help='Memory budget for the planner (default: half the available RAM)')
+    parser.add_argument('--spill-dir',
+                        help='Directory for --dedup spill runs (default: system temp dir)')
+    parser.add_argument('--profile', metavar='DIR',
+                        help='Profile each phase (generate, sort, write) and save PHASE.pstats and PHASE.collapsed in DIR')
+    parser.add_argument('--profile-mode', choices=['cprofile', 'sample'],
+                        default='cprofile',
+                        help='cprofile: deterministic profile plus stack samples; sample: stack samples only, lower overhead (default: cprofile)')
+    parser.add_argument('--sinks', metavar='FILE',
+                        help='JSON file of outputs, each with its own length bounds, policy and groups, all filled from one generation pass (replaces --output)')
+    split = parser.add_mutually_exclusive_group()
+    split.add_argument('--split-lines', type=int, metavar='N',
+                       help='Split the output into files of N candidates each')
+    split.add_argument('--split-files', type=int, metavar='K',
+                       help='Split the output into K files of equal size')
+    split.add_argument('--split-by-length', action='store_true',
+                       help='Write one file per candidate length')
+    args = parser.parse_args(argv)
 
     logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
 
     if not args.patterns:
         logging.error("No patterns provided")
         return
-    patterns = []
-    for p in args.patterns.split(';'):
-        p = p.strip()
-        out = []
-        for i, ch in enumerate(p):
-            if ch.lower() == 'w':
-                if args.pattern_mode == 'any':
-                    out.append(f'{{word{i}*}}')
-                elif args.pattern_mode == 'cap':
-                    out.append(f'{{word{i}}}')
-                else:
-                    out.append(f'{{word{i}}}')
-            elif ch.lower() == 'n':
-                out.append('{number}')
-            elif ch.lower() == 's':
-                out.append('{special}')
-            else:
-                logging.warning(f'Unsupported pattern character: {ch}')
-        patterns.append(''.join(out))
+    if args.index_every < 0:
+        parser.error('--index-every must not be negative')
+    for option in ('sample', 'split_lines', 'split_files'):
+        value = getattr(args, option)
+        if value is not None and value <= 0:
+            parser.error(f"--{option.replace('_', '-')} must be positive")
+    if (args.match or args.hash_only) and not args.hash:
+        parser.error('--match and --hash-only require --hash')
+    if args.match and args.split_files:
+        parser.error('--split-files cannot be combined with --match')
+    if args.hash and args.split_by_length:
+        parser.error('--split-by-length cannot be combined with --hash')
+    targets = None
+    if args.match:
+        # Fail before generating, not after
+        try:
+            targets = load_hashes(args.match, args.hash)
+        except OSError as e:
+            parser.error(f"Cannot read --match file: {e}")
+        if not targets:
+            logging.warning(
+                f"No {args.hash} hashes found in {args.match}, nothing will match")
+    sinks = None
+    if args.sinks:
+        if args.hash or args.sample or args.split_lines or args.split_files \
+                or args.split_by_length:
+            parser.error('--sinks cannot be combined with --hash, --sample or --split-*')
+        try:
+            sinks = load_sinks(args.sinks, args.min_length, args.max_length)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        # Generate the union of the sink bounds, within the global ones
+        args.min_length = max(args.min_length,
+                              min(sink.min_length for sink in sinks))
+        args.max_length = min(args.max_length,
+                              max(sink.max_length for sink in sinks))
 
-    if args.words or args.numbers or args.specials:
-        if args.words:
-            if args.words.startswith('@'):
-                words = load_list_from_file(args.words[1:])
-                word_groups = []
-            else:
-                words, word_groups = parse_word_groups(args.words)
-        else:
-            words, word_groups = [], []
+    generator = weaver_from_args(args, parser)
+    plan = plan_generation(
+        generator, args.workers,
+        args.memory_limit << 20 if args.memory_limit else None,
+        args.enumeration, args.dedup, not args.no_sort)
+    if args.explain:
+        print(format_plan(plan))
+        return
+    if args.profile:
+        phase = PhaseProfiler(args.profile, args.profile_mode).phase
+    else:
+        def phase(name):
+            return contextlib.nullcontext()
+    if sinks:
+        _write_sinks(args, generator, sinks, plan, phase)
+        return
+    if args.sample:
+        with phase('sample'):
+            good = generator.sample(args.sample, args.seed)
+        if len(good) < args.sample:
+            logging.warning(
+                f"Only {len(good)} of {args.sample} sampled candidates passed the checks")
+    else:
+        logging.debug(format_plan(plan))
+        good = execute_plan(generator, plan, args.spill_dir, phase)
+    try:
+        # Streamed strategies generate while writing, so that time lands here
+        with phase('write'):
+            _write_output(args, generator, good, targets)
+    finally:
+        if isinstance(good, SpilledSet):
+            good.close()
 
-        if args.numbers:
-            if args.numbers.startswith('@'):
-                numbers = load_list_from_file(args.numbers[1:])
-                number_groups = []
-            else:
-                numbers, number_groups = parse_number_groups(args.numbers)
-        else:
-            numbers, number_groups = [], []
-
-        if args.specials:
-            if args.specials.startswith('@'):
-                specials = load_list_from_file(args.specials[1:])
-                special_groups = []
-            elif ';' in args.specials:
-                specials, special_groups = parse_special_groups(args.specials)
-            else:
-                specials = list(args.specials)
-                special_groups = []
-        else:
-            specials, special_groups = [], []
 
+def _write_output(args, generator, good, targets=None):
+    if args.split_files and not hasattr(good, '__len__'):
+        good = list(good)
+    records = good
+    tally = None
+    if not hasattr(good, '__len__'):
+        # Streamed output: count candidates as they are consumed
+        tally = itertools.count()
+        records = (pw for pw, _ in zip(good, tally))
+    if args.hash:
+        records = hash_passwords(records, args.hash, targets,
+                                 args.hash_only, args.workers)
+    writer_options = _writer_options(args)
+    if args.split_lines or args.split_files or args.split_by_length:
+        manifest = write_partitioned(
+            args.output, records, split_lines=args.split_lines,
+            split_files=args.split_files, by_length=args.split_by_length,
+            total=len(good) if tally is None else None, **writer_options)
+        written = manifest['lines']
+        logging.info(
+            f"Split into {len(manifest['files'])} files, see {manifest_path(args.output)}")
     else:
-        words = []
-        numbers = []
-        specials = []
-        word_groups = []
-        number_groups = []
-        special_groups = []
+        written = write_wordlist(args.output, records, **writer_options)
 
-    if args.normalize:
-        words = list({generalize_string(w) for w in words})
+    generated = len(good) if tally is None else next(tally)
+    logging.info(f"Generated {generated} passwords to {args.output}")
+    if args.match:
+        logging.info(
+            f"Matched {written} candidates against {len(targets)} target hashes")
+    log_pool_stats(generator)
 
-    raw = generate_passwords(patterns, words, numbers, specials)
-    good = filter_passwords(raw, args.min_length, args.max_length,
-                            word_groups, number_groups, special_groups)
 
-    with open(args.output, 'w', encoding='utf-8') as f:
-        for pw in sorted(good):
-            f.write(pw + '\n')
+def _writer_options(args):
+    return {'index_every': args.index_every,
+            'separator': SEPARATORS[args.format],
+            'buffer_size': max(args.buffer_size, 1) << 10,
+            'use_writev': args.writev}
 
-    logging.info(f"Generated {len(good)} passwords to {args.output}")
-    logging.info(
-        f"Used {len(words)} words, {len(numbers)} numbers, {len(specials)} special chars")
-    all_groups = len(word_groups) + len(number_groups) + len(special_groups)
-    logging.info(f"Applied {all_groups} conflict rules")
+
+def _write_sinks(args, generator, sinks, plan, phase):
+    if plan['dedup'] == 'spill':
+        logging.warning('--sinks deduplicates in memory; spilling is not supported')
+    logging.debug(format_plan(plan))
+    workers = plan['workers'] if plan['enumeration'] == 'parallel' else 1
+    counts = fan_out(generator, sinks, dedup=plan['dedup'] != 'none',
+                     sort=plan['sort'], workers=workers, phase=phase,
+                     **_writer_options(args))
+    for sink, count in zip(sinks, counts):
+        logging.info(f"Generated {count} passwords to {sink.output}")
+    log_pool_stats(generator)
 
 
 if __name__ == '__main__':